@@ -0,0 +1,141 @@
+'''Vectorized checks over many grids at once, for ingesting large puzzle files.
+
+Grids are an (N, 9, 9) uint8 array with 0 for empty cells. Candidate masks use
+the same bit layout as the grader, bit d - 1 set when digit d is possible.
+Requires numpy.'''
+
+import numpy as np
+
+BIT_OF = np.zeros(256, dtype=np.uint16)
+BIT_OF[1:10] = 1 << np.arange(9)
+POPCOUNT = np.array([bin(mask).count('1') for mask in range(512)], dtype=np.uint8)
+ALL_DIGITS = np.uint16(0x1FF)
+
+
+def load_lines(lines):
+    '''Parses lines in the 81 character format into an (N, 9, 9) uint8 array,
+    blank lines and # comments are skipped. Raises ValueError on a line that
+    is not 81 digits or dots.'''
+    puzzles = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if len(line) != 81:
+            raise ValueError('line %d: expected 81 characters, got %d' % (number, len(line)))
+        puzzles.append(line)
+    data = np.frombuffer(''.join(puzzles).encode('ascii', 'replace'), dtype=np.uint8).reshape(-1, 9, 9)
+    grids = np.where(data == ord('.'), 0, data - ord('0')).astype(np.uint8)
+    if (grids > 9).any():
+        index = int(np.argmax((grids > 9).reshape(-1)))
+        raise ValueError('unexpected character %r' % puzzles[index // 81][index % 81])
+    return grids
+
+
+def boxes_as_rows(array):
+    '''Reorders an (N, 9, 9) array so that [grid, box, position] reads box by box.'''
+    return array.reshape(-1, 3, 3, 3, 3).transpose(0, 1, 3, 2, 4).reshape(-1, 9, 9)
+
+
+def unit_masks(grids):
+    '''Masks of the digits present in every row, column and box, (N, 9) each.'''
+    bits = BIT_OF[grids]
+    return (np.bitwise_or.reduce(bits, axis=2), np.bitwise_or.reduce(bits, axis=1),
+            np.bitwise_or.reduce(boxes_as_rows(bits), axis=2))
+
+
+def validate(grids):
+    '''True for grids whose values are in 0..9 and that have no digit
+    twice in a row, column or box: a unit is free of conflicts when it has
+    as many distinct digits as filled cells.'''
+    in_range = (grids <= 9).all(axis=(1, 2))
+    present = grids != 0
+    rows, cols, boxes = unit_masks(grids)
+    valid = ((POPCOUNT[rows] == present.sum(axis=2)).all(axis=1) &
+             (POPCOUNT[cols] == present.sum(axis=1)).all(axis=1) &
+             (POPCOUNT[boxes] == boxes_as_rows(present).sum(axis=2)).all(axis=1))
+    return in_range & valid
+
+
+def filled(grids):
+    return (grids != 0).all(axis=(1, 2))
+
+
+def candidate_masks(grids):
+    '''(N, 9, 9) uint16 masks of digits not yet used in a cell's row, column
+    or box, 0 for filled cells.'''
+    rows, cols, boxes = unit_masks(grids)
+    boxes = boxes.reshape(-1, 3, 3).repeat(3, axis=1).repeat(3, axis=2)
+    used = rows[:, :, None] | cols[:, None, :] | boxes
+    return np.where(grids == 0, ALL_DIGITS & ~used, 0).astype(np.uint16)
+
+
+DIGIT_BITS = BIT_OF[1:10]
+UNIT_TYPES = np.array([[[row * 9 + col for col in range(9)] for row in range(9)],
+                       [[row * 9 + col for row in range(9)] for col in range(9)],
+                       [[(3 * (box // 3) + pos // 3) * 9 + 3 * (box % 3) + pos % 3 for pos in range(9)]
+                        for box in range(9)]])
+
+
+def initial_masks(grids):
+    '''(N, 81) masks where a filled cell holds the bit of its digit and an
+    empty cell its candidates.'''
+    masks = np.where(grids == 0, candidate_masks(grids), BIT_OF[grids])
+    return masks.reshape(-1, 81).astype(np.uint16)
+
+
+def singles_step(masks):
+    '''Applies every naked and hidden single of every puzzle at once. Per unit,
+    digits seen once are tracked with two running masks (seen, seen twice)
+    over the nine cells.'''
+    single = POPCOUNT[masks] == 1
+    placed = np.where(single, masks, 0)
+    open_masks = np.where(single, 0, masks)
+    eliminated = np.zeros_like(masks)
+    hidden = np.zeros_like(masks)
+
+    for cells in UNIT_TYPES:
+        flat = cells.ravel()
+        unit_placed = placed[:, cells]
+        unit_open = open_masks[:, cells]
+        used = np.zeros(unit_open.shape[:2], dtype=np.uint16)
+        seen = np.zeros_like(used)
+        twice = np.zeros_like(used)
+        for pos in range(9):
+            used |= unit_placed[:, :, pos]
+            twice |= seen & unit_open[:, :, pos]
+            seen |= unit_open[:, :, pos]
+        once = seen & ~twice & ~used
+        eliminated[:, flat] |= np.broadcast_to(used[:, :, None], unit_open.shape).reshape(-1, 81)
+        hidden[:, flat] |= (unit_open & once[:, :, None]).reshape(-1, 81)
+
+    masks = np.where(single, masks, masks & ~eliminated)
+    return np.where(~single & (hidden != 0), hidden, masks)
+
+
+def propagate_singles(masks, max_iterations=81):
+    '''Runs naked and hidden singles over (N, 81) masks until no puzzle changes.
+    Returns the final masks and boolean arrays of solved and contradictory
+    puzzles. Puzzles that reached their fixpoint are dropped from later sweeps.'''
+    masks = masks.copy()
+    active = np.arange(len(masks))
+    for _ in range(max_iterations):
+        if not len(active):
+            break
+        current = masks[active]
+        updated = singles_step(current)
+        changed = (updated != current).any(axis=1)
+        masks[active] = updated
+        active = active[changed]
+
+    sizes = POPCOUNT[masks]
+    units = np.concatenate([np.bitwise_or.reduce(np.where(sizes == 1, masks, 0)[:, cells], axis=2)
+                            for cells in UNIT_TYPES], axis=1)
+    contradiction = (sizes == 0).any(axis=1) | (POPCOUNT[units] < (sizes == 1)[:, UNIT_TYPES.reshape(27, 9)].sum(axis=2)).any(axis=1)
+    solved = (sizes == 1).all(axis=1) & ~contradiction
+    return masks, solved, contradiction
+
+
+def classify_easy(grids):
+    '''True for puzzles that naked and hidden singles solve, like grader.is_easy.'''
+    return propagate_singles(initial_masks(grids))[1]
@@ -0,0 +1,187 @@
+'''Benchmarks for the generator and grader hot paths.
+
+Runs every benchmark over a corpus generated from a fixed seed and prints
+JSON with timing percentiles. With --compare the run is checked against a
+saved baseline and the exit code is 1 if any median got slower than the
+threshold allows.
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --compare baseline.json'''
+
+import argparse
+import copy
+import json
+import platform
+import random
+import sys
+import time
+from cache import uniqueness_cache, grade_cache
+from generator import Board, SOLVERS, generate_seeded
+from grader import Sudoku, grade, is_easy, is_medium
+from utility import copy_grid, grid_from_line
+
+HARD_CASES = [
+    '4.....8.5.3..........7......2.....6.....8.4......1.......6.3.7.5..2.....1.4......',
+    '8..........36......7..9.2...5...7.......457.....1...3...1....68..85...1..9....4..',
+    '..............3.85..1.2.......5.7.....4...1...9.......5......73..2.1........4...9',
+]
+
+
+def build_corpus(seed, size):
+    rng = random.Random(seed)
+    solved = []
+    for _ in range(size):
+        board = Board(rng=rng)
+        board.fill()
+        solved.append(board.grid)
+
+    puzzles = {difficulty: [generate_seeded(difficulty, rng.getrandbits(64))[0] for _ in range(size)]
+               for difficulty in ('Easy', 'Medium', 'Hard')}
+    return {'solved': solved, 'puzzles': puzzles, 'hard': [grid_from_line(line) for line in HARD_CASES]}
+
+
+def stuck_state(puzzle):
+    '''Sudoku state after singles ran out, where the other strategies have work to do.'''
+    sudoku = Sudoku()
+    sudoku.grid = [num for row in puzzle for num in row]
+    sudoku.initialize_candidates_grid()
+    while sudoku.naked_singles() or sudoku.hidden_singles():
+        pass
+    return sudoku
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(samples):
+    return {'count': len(samples), 'mean': sum(samples) / len(samples), 'min': min(samples),
+            'p50': percentile(samples, 0.5), 'p90': percentile(samples, 0.9),
+            'p99': percentile(samples, 0.99), 'max': max(samples)}
+
+
+def timed(samples, func, *args):
+    start = time.perf_counter()
+    func(*args)
+    samples.append(time.perf_counter() - start)
+
+
+def run_benchmarks(corpus, repeat, seed):
+    '''Times every benchmark with the result caches disabled, so solvers and
+    grader do their full work each time. The cached paths are timed last under
+    their own names.'''
+    all_puzzles = [puzzle for puzzles in corpus['puzzles'].values() for puzzle in puzzles]
+    benchmarks = {}
+    cache_sizes = uniqueness_cache.maxsize, grade_cache.maxsize
+    uniqueness_cache.configure(0)
+    grade_cache.configure(0)
+
+    def bench(name, cases, func):
+        samples = []
+        for _ in range(repeat):
+            for case in cases:
+                timed(samples, func, case)
+        benchmarks[name] = summarize(samples)
+
+    def fill(rng):
+        Board(rng=rng).fill()
+
+    bench('Board.fill', [random.Random(seed + i) for i in range(len(corpus['solved']))], fill)
+
+    for solver in SOLVERS:
+        board = Board(solver=solver)
+
+        def uniqueness_check(puzzle):
+            board.grid = puzzle
+            board.uniqueness_check()
+
+        bench('Board.uniqueness_check[%s]' % solver, all_puzzles, uniqueness_check)
+        if solver != 'backtracking':
+            bench('Board.uniqueness_check[%s,hard]' % solver, corpus['hard'], uniqueness_check)
+
+    def remove_clues(method, *args):
+        def run(grid):
+            board = Board(rng=random.Random(seed))
+            board.grid = copy_grid(grid)
+            getattr(board, method)(*args)
+        return run
+
+    bench('Board.remove_clues_easy', corpus['solved'], remove_clues('remove_clues_easy', 45))
+    bench('Board.remove_clues_medium', corpus['solved'], remove_clues('remove_clues_medium', 50, 5))
+
+    bench('is_easy', all_puzzles, is_easy)
+    bench('is_medium', all_puzzles, is_medium)
+    bench('grade', all_puzzles, grade)
+
+    states = [stuck_state(puzzle) for puzzle in all_puzzles]
+    for _, strategy in Sudoku().hard_strategies:
+        name = strategy.__name__
+        samples = []
+        for _ in range(repeat):
+            for state in states:
+                sudoku = copy.deepcopy(state)
+                timed(samples, getattr(sudoku, name))
+        benchmarks['Sudoku.%s' % name] = summarize(samples)
+
+    uniqueness_cache.configure(cache_sizes[0])
+    grade_cache.configure(cache_sizes[1])
+    board = Board()
+
+    def cached_uniqueness_check(puzzle):
+        board.grid = puzzle
+        board.uniqueness_check()
+
+    for puzzle in all_puzzles:
+        cached_uniqueness_check(puzzle)
+        grade(puzzle)
+    bench('Board.uniqueness_check[cached]', all_puzzles, cached_uniqueness_check)
+    bench('grade[cached]', all_puzzles, grade)
+    return benchmarks
+
+
+def compare(results, baseline, threshold):
+    '''Ratio of current to baseline median per benchmark, flags the ones
+    slower than 1 + threshold.'''
+    report = {}
+    for name, stats in results.items():
+        if name not in baseline:
+            continue
+        ratio = stats['p50'] / baseline[name]['p50'] if baseline[name]['p50'] else float('inf')
+        report[name] = {'baseline_p50': baseline[name]['p50'], 'p50': stats['p50'],
+                        'ratio': ratio, 'regression': ratio > 1 + threshold}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seed', type=int, default=2024)
+    parser.add_argument('--size', type=int, default=10, help='grids per corpus category')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write results to this file as well')
+    parser.add_argument('--compare', help='baseline results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='allowed slowdown of the median')
+    args = parser.parse_args(argv)
+
+    corpus = build_corpus(args.seed, args.size)
+    results = {'meta': {'seed': args.seed, 'size': args.size, 'repeat': args.repeat,
+                        'python': platform.python_version()},
+               'benchmarks': run_benchmarks(corpus, args.repeat, args.seed)}
+
+    regressions = False
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        results['comparison'] = compare(results['benchmarks'], baseline['benchmarks'], args.threshold)
+        regressions = any(entry['regression'] for entry in results['comparison'].values())
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    print(output)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
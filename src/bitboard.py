@@ -0,0 +1,114 @@
+from geometry import geometry_of
+
+
+class BitBoard:
+    '''Flat board of N * N cells that keeps row, column and box occupancy as
+    N-bit masks, updated incrementally as digits are placed and removed.'''
+
+    def __init__(self, grid):
+        board = geometry_of(grid)
+        self.size = n = board.size
+        self.all_digits = board.all_digits
+        self.box_of = board.box_of
+        self.popcount = board.popcount
+        self.digits = board.digits
+        self.cells = [0] * (n * n)
+        self.rows = [0] * n
+        self.cols = [0] * n
+        self.boxes = [0] * n
+        self.solutions_count = 0
+        self.nodes = 0
+        self.max_nodes = float('inf')
+        for row in range(n):
+            for col in range(n):
+                if grid[row][col] != 0:
+                    self.place(row * n + col, grid[row][col])
+
+    def place(self, index, num):
+        bit = 1 << (num - 1)
+        self.cells[index] = num
+        self.rows[index // self.size] |= bit
+        self.cols[index % self.size] |= bit
+        self.boxes[self.box_of[index]] |= bit
+
+    def remove(self, index):
+        bit = ~(1 << (self.cells[index] - 1))
+        self.cells[index] = 0
+        self.rows[index // self.size] &= bit
+        self.cols[index % self.size] &= bit
+        self.boxes[self.box_of[index]] &= bit
+
+    def candidates(self, index):
+        n = self.size
+        return self.all_digits & ~(self.rows[index // n] | self.cols[index % n] | self.boxes[self.box_of[index]])
+
+    def to_grid(self):
+        n = self.size
+        return [self.cells[row * n:row * n + n] for row in range(n)]
+
+    def most_constrained(self, empty):
+        '''Returns position in empty of the cell with the fewest candidates
+        together with its candidate mask (MRV heuristic).'''
+        popcount = self.popcount
+        best, best_mask, best_count = 0, 0, self.size + 1
+        for pos, index in enumerate(empty):
+            mask = self.candidates(index)
+            count = popcount[mask]
+            if count < best_count:
+                best, best_mask, best_count = pos, mask, count
+                if count <= 1:
+                    break
+        return best, best_mask
+
+    def search(self, empty, limit, rng):
+        '''Backtracks over empty cells branching on the most constrained one,
+        stops once limit solutions are found or after max_nodes nodes. Digits of
+        the last solution found are left on the board.'''
+        self.nodes += 1
+        if self.nodes > self.max_nodes:
+            return True
+        if not empty:
+            self.solutions_count += 1
+            return self.solutions_count >= limit
+
+        pos, mask = self.most_constrained(empty)
+        if not mask:
+            return False
+
+        index = empty[pos]
+        empty[pos] = empty[-1]
+        empty.pop()
+
+        nums = list(self.digits[mask])
+        if rng is not None:
+            rng.shuffle(nums)
+        for num in nums:
+            self.place(index, num)
+            if self.search(empty, limit, rng):
+                return True
+            self.remove(index)
+
+        empty.append(index)
+        empty[pos], empty[-1] = empty[-1], empty[pos]
+        return False
+
+    def count_solutions(self, limit=2):
+        '''Counts solutions up to limit, the board is left as it was.'''
+        empty = [i for i in range(len(self.cells)) if self.cells[i] == 0]
+        self.solutions_count = 0
+        self.search(list(empty), limit, None)
+        for index in empty:
+            if self.cells[index]:
+                self.remove(index)
+        return self.solutions_count
+
+    def solve(self, rng=None, max_nodes=None):
+        '''Fills the board with the first solution found, digits are tried
+        in random order when rng is given. Gives up after max_nodes nodes,
+        leaving the board partly filled.'''
+        empty = [i for i in range(len(self.cells)) if self.cells[i] == 0]
+        self.solutions_count = 0
+        self.max_nodes = float('inf') if max_nodes is None else max_nodes
+        self.search(empty, 1, rng)
+        self.max_nodes = float('inf')
+        return self.solutions_count > 0
@@ -0,0 +1,179 @@
+'''State of a game in progress: the player's entries, pencil marks and history.
+
+Digit counts per row, column and box, the number of correctly filled cells and
+pencil marks as digit masks are kept up to date on every change, so placing a
+digit, checking for conflicts and detecting the win take constant time.
+Every move is journaled as a group of changes that undo and redo replay.'''
+
+from geometry import geometry_of
+from utility import get_filled
+
+CELL, MARKS, AUTO_MARKS = 0, 1, 2
+
+
+class BoardModel:
+    def __init__(self, puzzle, solution):
+        self.geometry = geometry_of(puzzle)
+        self.size = n = self.geometry.size
+        self.grid = [row.copy() for row in puzzle]
+        self.solution = solution
+        self.locked = get_filled(puzzle)
+        self.marks = [0] * (n * n)
+        self.counts = [[0] * (n + 1) for _ in self.geometry.units]
+        self.correct = 0
+        self.auto_marks = False
+        self.undo_stack = []
+        self.redo_stack = []
+        self.group = None
+        for r in range(n):
+            for c in range(n):
+                num = self.grid[r][c]
+                if num:
+                    self.count(r * n + c, num, 1)
+
+    @property
+    def solved(self):
+        return self.correct == self.size * self.size
+
+    def count(self, index, num, delta):
+        for u, _ in self.geometry.cell_units[index]:
+            self.counts[u][num] += delta
+        if num == self.solution[index // self.size][index % self.size]:
+            self.correct += delta
+
+    def value(self, r, c):
+        return self.grid[r][c]
+
+    def pencil_marks(self, r, c):
+        return self.geometry.digits[self.marks[r * self.size + c]]
+
+    def all_pencil_marks(self):
+        '''Pencil marks of every cell as {(row, col): digits}, the form hints take.'''
+        return {divmod(index, self.size): set(self.geometry.digits[mask])
+                for index, mask in enumerate(self.marks) if mask}
+
+    def is_conflict(self, r, c):
+        '''True when the digit in the cell is repeated in its row, column or box.'''
+        num = self.grid[r][c]
+        return bool(num) and any(self.counts[u][num] > 1 for u, _ in self.geometry.cell_units[r * self.size + c])
+
+    def candidates(self, index):
+        '''Digits not yet used in the units of a cell, as a mask.'''
+        used = 0
+        for u, _ in self.geometry.cell_units[index]:
+            counts = self.counts[u]
+            for num in range(1, self.size + 1):
+                if counts[num]:
+                    used |= 1 << (num - 1)
+        return self.geometry.all_digits & ~used
+
+    def apply(self, kind, index, value):
+        '''Changes a cell value, mark mask or the automatic marks setting without
+        journaling, returns the old one.'''
+        if kind == AUTO_MARKS:
+            old, self.auto_marks = self.auto_marks, value
+            return old
+        if kind == MARKS:
+            old, self.marks[index] = self.marks[index], value
+            return old
+        r, c = divmod(index, self.size)
+        old = self.grid[r][c]
+        if old:
+            self.count(index, old, -1)
+        self.grid[r][c] = value
+        if value:
+            self.count(index, value, 1)
+        return old
+
+    def change(self, kind, index, value):
+        old = self.apply(kind, index, value)
+        if old != value:
+            self.group.append((kind, index, old, value))
+
+    def affected(self, changes):
+        '''Cells to redraw after changes: the changed cells and, for new or removed
+        digits, the peers holding the same digit whose conflict state may differ.'''
+        cells = set()
+        for kind, index, old, new in changes:
+            if kind == AUTO_MARKS:
+                continue
+            cells.add(divmod(index, self.size))
+            if kind == CELL:
+                for peer in self.geometry.peers[index]:
+                    r, c = divmod(peer, self.size)
+                    if self.grid[r][c] and self.grid[r][c] in (old, new):
+                        cells.add((r, c))
+        return cells
+
+    def move(self, changes):
+        '''Runs changes(), a function making journaled changes, as one undo step.'''
+        self.group = []
+        changes()
+        group, self.group = self.group, None
+        if group:
+            self.undo_stack.append(group)
+            self.redo_stack.clear()
+        return self.affected(group)
+
+    def set_value(self, r, c, num):
+        '''Places num (0 clears) in a cell the puzzle left open. With automatic
+        pencil marks the digit is removed from or restored to the peers' marks.
+        Returns the cells to redraw.'''
+        if (r, c) in self.locked or self.grid[r][c] == num:
+            return set()
+        return self.move(lambda: self.place(r * self.size + c, num))
+
+    def place(self, index, num):
+        n = self.size
+        old = self.grid[index // n][index % n]
+        self.change(CELL, index, num)
+        if not self.auto_marks:
+            return
+        self.change(MARKS, index, 0 if num else self.candidates(index))
+        for peer in self.geometry.peers[index]:
+            if self.grid[peer // n][peer % n]:
+                continue
+            marks = self.marks[peer]
+            if num:
+                marks &= ~(1 << (num - 1))
+            if old and self.candidates(peer) >> (old - 1) & 1:
+                marks |= 1 << (old - 1)
+            self.change(MARKS, peer, marks)
+
+    def toggle_mark(self, r, c, num):
+        if (r, c) in self.locked:
+            return set()
+        index = r * self.size + c
+        return self.move(lambda: self.change(MARKS, index, self.marks[index] ^ 1 << (num - 1)))
+
+    def set_auto_marks(self, enabled):
+        '''Turning automatic pencil marks on fills every open cell with its
+        candidates, later placements keep them current. The setting is journaled
+        with the marks, so undo turns it back off.'''
+        def toggle():
+            self.change(AUTO_MARKS, 0, enabled)
+            if not enabled:
+                return
+            n = self.size
+            for index in range(n * n):
+                if not self.grid[index // n][index % n]:
+                    self.change(MARKS, index, self.candidates(index))
+        return self.move(toggle)
+
+    def undo(self):
+        if not self.undo_stack:
+            return set()
+        group = self.undo_stack.pop()
+        for kind, index, old, new in reversed(group):
+            self.apply(kind, index, old)
+        self.redo_stack.append(group)
+        return self.affected(group)
+
+    def redo(self):
+        if not self.redo_stack:
+            return set()
+        group = self.redo_stack.pop()
+        for kind, index, old, new in group:
+            self.apply(kind, index, new)
+        self.undo_stack.append(group)
+        return self.affected(group)
@@ -0,0 +1,89 @@
+'''Bounded caches for solver and grader results keyed by Zobrist hashes of grids.
+
+Every (cell, digit) pair has a fixed random 64-bit key and the hash of a grid is
+the XOR of the keys of its filled cells, so changing one cell updates the hash
+with two XORs instead of rehashing the whole grid.'''
+
+import random
+from collections import OrderedDict
+
+_keys = random.Random(0x5D0C0)
+ZOBRIST = [[0] + [_keys.getrandbits(64) for _ in range(9)] for _ in range(81)]
+_tables = {9: ZOBRIST}
+
+
+def zobrist_table(size):
+    '''Keys of every (cell, digit) pair of a size x size board, ZOBRIST for 9x9.'''
+    if size not in _tables:
+        keys = random.Random(0x5D0C0 + size)
+        _tables[size] = [[0] + [keys.getrandbits(64) for _ in range(size)] for _ in range(size * size)]
+    return _tables[size]
+
+
+def zobrist_hash(grid):
+    size = len(grid)
+    table = zobrist_table(size)
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            value ^= table[row * size + col][grid[row][col]]
+    return value
+
+
+class LRUCache:
+    '''Mapping with at most maxsize entries. With the 'lru' policy lookups refresh
+    an entry and the least recently used one is evicted, with 'fifo' the oldest
+    inserted entry is evicted. maxsize 0 disables the cache.'''
+
+    def __init__(self, maxsize=4096, policy='lru'):
+        self.maxsize = maxsize
+        self.policy = policy
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.configure(maxsize, policy)
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.policy == 'lru':
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def configure(self, maxsize=None, policy=None):
+        if policy is not None:
+            if policy not in ('lru', 'fifo'):
+                raise ValueError('unknown eviction policy %r' % policy)
+            self.policy = policy
+        if maxsize is not None:
+            self.maxsize = maxsize
+            while len(self.entries) > max(maxsize, 0):
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'size': len(self.entries), 'maxsize': self.maxsize, 'policy': self.policy,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+uniqueness_cache = LRUCache(maxsize=65536)
+grade_cache = LRUCache(maxsize=16384)
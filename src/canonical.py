@@ -0,0 +1,175 @@
+'''Canonical form of a grid under the Sudoku symmetry group and a persistent
+index of canonical forms for rejecting duplicate puzzles in generated packs.
+
+The canonical form is the lexicographically smallest row-major string over
+transposition, band/row and stack/column permutations, with digits relabelled
+in order of first appearance and empty cells kept as 0. It is built one row at
+a time keeping only the arrangements that tie for the smallest prefix, so the
+search never expands branches that are already larger. Empty lines that can be
+swapped without changing the grid are tried only once, otherwise the tied
+arrangements of sparse grids would multiply.'''
+
+import hashlib
+import os
+
+
+def _relabel(values, order, mapping, next_label):
+    '''Image of values read in order, digits get new labels in order of first
+    appearance. Returns the image and the extended mapping.'''
+    image = []
+    for index in order:
+        num = values[index]
+        if num and not mapping[num]:
+            mapping = mapping.copy()
+            mapping[num] = next_label
+            next_label += 1
+        image.append(mapping[num] if num else 0)
+    return tuple(image), mapping, next_label
+
+
+def _next_choices(order, empty=frozenset()):
+    '''Indices allowed at the next position: any line of an unused band (stack)
+    at a band boundary, otherwise the unused lines of the current band. Of the
+    empty lines of a band, and of the lines of wholly empty bands, only the first
+    is returned since swapping them leaves the grid unchanged.'''
+    if len(order) % 3 == 0:
+        used = {index // 3 for index in order}
+        choices = [index for index in range(9) if index // 3 not in used]
+    else:
+        band = order[-1] // 3
+        choices = [index for index in range(3 * band, 3 * band + 3) if index not in order]
+    if not empty:
+        return choices
+    result, seen = [], set()
+    for index in choices:
+        if index in empty:
+            band = index // 3
+            key = None if empty.issuperset(range(3 * band, 3 * band + 3)) else band
+            if key in seen:
+                continue
+            seen.add(key)
+        result.append(index)
+    return result
+
+
+def _empty_lines(lines):
+    return frozenset(index for index, line in enumerate(lines) if not any(line))
+
+
+def _first_row_states(grid):
+    '''Minimal first row image with all (grid, empty rows, rows, cols, mapping,
+    next_label) states producing it. Column orders are built position by position
+    keeping only ties, and a row is abandoned as soon as its prefix exceeds the
+    best one found.'''
+    best, states = None, []
+    for oriented in (grid, [list(column) for column in zip(*grid)]):
+        empty_rows = _empty_lines(oriented)
+        empty_cols = _empty_lines(zip(*oriented))
+        for row in _next_choices((), empty_rows):
+            values = oriented[row]
+            partial = [((), [0] * 10, 1)]
+            image = []
+            tied = best is not None
+            for position in range(9):
+                level_best, level = None, []
+                for cols, mapping, next_label in partial:
+                    for col in _next_choices(cols, empty_cols):
+                        num = values[col]
+                        label = (mapping[num] or next_label) if num else 0
+                        if level_best is None or label < level_best:
+                            level_best, level = label, []
+                        if label != level_best:
+                            continue
+                        if num and not mapping[num]:
+                            new_mapping = mapping.copy()
+                            new_mapping[num] = next_label
+                            level.append((cols + (col,), new_mapping, next_label + 1))
+                        else:
+                            level.append((cols + (col,), mapping, next_label))
+                if tied and level_best != best[position]:
+                    if level_best > best[position]:
+                        break
+                    tied = False
+                image.append(level_best)
+                partial = level
+            else:
+                image = tuple(image)
+                if best is None or image < best:
+                    best, states = image, []
+                states.extend((oriented, empty_rows, (row,), cols, mapping, next_label)
+                              for cols, mapping, next_label in partial)
+    return best, states
+
+
+def canonical_form(grid):
+    '''Returns the canonical 81 character string of a grid, empty cells as '0'.'''
+    first, states = _first_row_states(grid)
+    rows_out = [first]
+    for _ in range(8):
+        best, level = None, []
+        for oriented, empty_rows, rows, cols, mapping, next_label in states:
+            for row in _next_choices(rows, empty_rows):
+                image, new_mapping, new_next = _relabel(oriented[row], cols, mapping, next_label)
+                if best is None or image < best:
+                    best, level = image, []
+                if image == best:
+                    level.append((oriented, empty_rows, rows + (row,), cols, new_mapping, new_next))
+        rows_out.append(best)
+        states = level
+    return ''.join(str(num) for row in rows_out for num in row)
+
+
+class CanonicalIndex:
+    '''Set of canonical forms stored as 16 byte digests. With a path, digests are
+    loaded from and appended to that file so the index survives across runs.'''
+
+    DIGEST_SIZE = 16
+
+    def __init__(self, path=None):
+        self.digests = set()
+        self.file = None
+        if path is not None:
+            if os.path.exists(path):
+                with open(path, 'rb') as file:
+                    data = file.read()
+                size = self.DIGEST_SIZE
+                self.digests.update(data[i:i + size] for i in range(0, len(data) - size + 1, size))
+            self.file = open(path, 'ab')
+
+    def digest(self, grid):
+        return hashlib.blake2b(canonical_form(grid).encode(), digest_size=self.DIGEST_SIZE).digest()
+
+    def __contains__(self, grid):
+        return self.digest(grid) in self.digests
+
+    def __len__(self):
+        return len(self.digests)
+
+    def add(self, grid):
+        '''Adds a grid, returns False if an equivalent grid was already indexed.'''
+        digest = self.digest(grid)
+        if digest in self.digests:
+            return False
+        self.digests.add(digest)
+        if self.file is not None:
+            self.file.write(digest)
+        return True
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def unique_puzzles(puzzles, index, key=None):
+    '''Passes through puzzles from a stream whose grid (key(puzzle), the puzzle
+    itself by default) is not equivalent to one already in the index.'''
+    for puzzle in puzzles:
+        if index.add(puzzle if key is None else key(puzzle)):
+            yield puzzle
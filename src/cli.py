@@ -0,0 +1,153 @@
+'''Headless command line tools, usable without a display or pygame.
+
+Puzzles are read from stdin one per line in the 81 character format (empty
+cells '0' or '.') and results are written to stdout one line per puzzle.
+16x16 and 25x25 boards are lines of 256 and 625 characters, digits above 9
+written as letters.
+
+    python cli.py solve < puzzles.txt
+    python cli.py grade < puzzles.txt
+    python cli.py generate --difficulty Hard --count 100 --seed 7 > hard.txt'''
+
+import argparse
+import json
+import sys
+import dlx
+from bitboard import BitBoard
+from generator import generate_puzzles
+from grader import grade, solve_logically
+from utility import grid_from_line, grid_to_line, has_conflicts
+
+SEARCH_NODES = 100000
+
+
+def read_puzzles(stream):
+    '''Yields (line number, grid) for every non empty line that is not a # comment,
+    lines that do not parse are reported on stderr and give None as grid.'''
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            yield number, grid_from_line(line)
+        except ValueError as error:
+            print('line %d: %s' % (number, error), file=sys.stderr)
+            yield number, None
+
+
+def find_solution(grid, max_nodes=SEARCH_NODES):
+    '''Returns (solutions, solution) with solutions counted up to 2. Conflicting
+    clues have no solution and a puzzle solved by logic alone has exactly one,
+    others are counted with DLX on 9x9 boards and with the bitmask solver on
+    larger ones, which gives up after max_nodes nodes: solutions is then None
+    and solution the one found before, if any.'''
+    if has_conflicts(grid):
+        return 0, None
+    solution = solve_logically(grid)
+    if solution is not None and not has_conflicts(solution):
+        return 1, solution
+    if len(grid) == 9:
+        solutions = dlx.count_solutions(grid, 2)
+    else:
+        board = BitBoard(grid)
+        board.max_nodes = max_nodes
+        solutions = board.count_solutions(2)
+        if board.nodes > max_nodes:
+            if not solutions:
+                return None, None
+            solutions = None
+    if solutions == 0:
+        return 0, None
+    board = BitBoard(grid)
+    board.solve(max_nodes=max_nodes)
+    return solutions, board.to_grid()
+
+
+def solve(args, stdin, stdout):
+    '''Writes the solution of every puzzle, an empty line for puzzles without one.'''
+    failures = 0
+    for number, grid in read_puzzles(stdin):
+        solutions, solution = (0, None) if grid is None else find_solution(grid)
+        if solution is None:
+            if grid is not None:
+                print('line %d: %s' % (number, 'no solution' if solutions == 0 else
+                                       'no solution found within the search budget'), file=sys.stderr)
+            failures += 1
+            stdout.write('\n')
+            continue
+        if solutions is None:
+            print('line %d: uniqueness unknown, search budget exhausted' % number, file=sys.stderr)
+        elif solutions > 1:
+            print('line %d: more than one solution' % number, file=sys.stderr)
+        stdout.write(grid_to_line(solution) + '\n')
+        stdout.flush()
+    return 1 if failures else 0
+
+
+def grade_puzzles(args, stdin, stdout):
+    '''Writes puzzle, difficulty, rating and hardest technique tab separated,
+    or with --json the full grade report as one JSON object per line.
+    Lines that do not parse give an empty line.'''
+    failures = 0
+    for number, grid in read_puzzles(stdin):
+        if grid is None:
+            failures += 1
+            stdout.write('\n')
+            continue
+        report = grade(grid)
+        line = grid_to_line(grid)
+        if args.json:
+            stdout.write(json.dumps(dict(report.as_dict(), puzzle=line)) + '\n')
+        else:
+            stdout.write('%s\t%s\t%d\t%s\n' % (line, report.difficulty or 'Unsolved', report.rating,
+                                               report.hardest or '-'))
+        stdout.flush()
+    return 1 if failures else 0
+
+
+def generate(args, stdin, stdout):
+    '''Writes puzzles as they finish, followed by a tab and the solution with
+    --solutions. A seed makes the set of puzzles reproducible, not their order.
+    Puzzles that grade outside the requested difficulty are reported on stderr.'''
+    for index, grid, solution in generate_puzzles(args.difficulty, args.count, workers=args.workers,
+                                                  seed=args.seed, variants=args.variants, size=args.size):
+        graded = grade(grid).difficulty
+        if graded != args.difficulty:
+            print('puzzle %d: grades %s, not %s' % (index, graded, args.difficulty), file=sys.stderr)
+        line = grid_to_line(grid)
+        if args.solutions:
+            line += '\t' + grid_to_line(solution)
+        stdout.write(line + '\n')
+        stdout.flush()
+    return 0
+
+
+def main(argv=None, stdin=None, stdout=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('solve', help='solve puzzles from stdin').set_defaults(run=solve)
+
+    grade_parser = commands.add_parser('grade', help='grade puzzles from stdin')
+    grade_parser.add_argument('--json', action='store_true', help='write grade reports as JSON lines')
+    grade_parser.set_defaults(run=grade_puzzles)
+
+    generate_parser = commands.add_parser('generate', help='generate puzzles')
+    generate_parser.add_argument('--difficulty', choices=('Easy', 'Medium', 'Hard'), default='Medium')
+    generate_parser.add_argument('--count', type=int, default=1)
+    generate_parser.add_argument('--seed', type=int)
+    generate_parser.add_argument('--workers', type=int, help='processes, all cores by default')
+    generate_parser.add_argument('--size', type=int, choices=(9, 16, 25), default=9, help='board size')
+    generate_parser.add_argument('--variants', type=int, default=1,
+                                 help='equivalent puzzles derived from every generated one')
+    generate_parser.add_argument('--solutions', action='store_true', help='append the solution to every line')
+    generate_parser.set_defaults(run=generate)
+
+    args = parser.parse_args(argv)
+    if args.run is generate and args.variants > 1 and args.size != 9:
+        parser.error('--variants needs --size 9')
+    return args.run(args, stdin or sys.stdin, stdout or sys.stdout)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
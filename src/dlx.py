@@ -0,0 +1,143 @@
+'''Exact cover solver (Knuth's Algorithm X with Dancing Links).
+
+Sudoku is modelled as 729 candidate rows (cell, digit) over 324 constraint
+columns: every cell holds a digit, every row/column/box holds every digit once.'''
+
+import telemetry
+from utility import BOX_OF
+
+
+def _constraints(index, num):
+    row, col, d = index // 9, index % 9, num - 1
+    return (index, 81 + row * 9 + d, 162 + col * 9 + d, 243 + BOX_OF[index] * 9 + d)
+
+
+class DLXMatrix:
+    '''Dancing links matrix stored in flat lists, node 0 is the root and
+    nodes 1..324 are the column headers.'''
+
+    _template = None
+
+    def __init__(self):
+        if DLXMatrix._template is None:
+            DLXMatrix._template = self.build()
+        left, right, up, down, column, size, first_node = DLXMatrix._template
+        self.left, self.right, self.up, self.down = list(left), list(right), list(up), list(down)
+        self.column = column
+        self.size = list(size)
+        self.first_node = first_node
+        self.solutions_count = 0
+        self.nodes = 0
+
+    @staticmethod
+    def build():
+        left, right = list(range(-1, 324)), list(range(1, 326))
+        left[0], right[324] = 324, 0
+        up, down = list(range(325)), list(range(325))
+        column, size = list(range(325)), [0] * 325
+        first_node = []
+
+        for index in range(81):
+            for num in range(1, 10):
+                start = len(column)
+                first_node.append(start)
+                for i, col in enumerate(_constraints(index, num)):
+                    node = start + i
+                    col += 1
+                    column.append(col)
+                    left.append(start + (i - 1) % 4)
+                    right.append(start + (i + 1) % 4)
+                    up.append(up[col])
+                    down.append(col)
+                    down[up[col]] = node
+                    up[col] = node
+                    size[col] += 1
+        return left, right, up, down, column, size, first_node
+
+    def cover(self, col):
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.size
+        right[left[col]] = right[col]
+        left[right[col]] = left[col]
+        i = down[col]
+        while i != col:
+            j = right[i]
+            while j != i:
+                down[up[j]] = down[j]
+                up[down[j]] = up[j]
+                size[column[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    def uncover(self, col):
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.size
+        i = up[col]
+        while i != col:
+            j = left[i]
+            while j != i:
+                size[column[j]] += 1
+                down[up[j]] = j
+                up[down[j]] = j
+                j = left[j]
+            i = up[i]
+        right[left[col]] = col
+        left[right[col]] = col
+
+    def select(self, index, num):
+        '''Covers all columns of a given clue, returns False if the clue
+        conflicts with clues selected before.'''
+        node = self.first_node[index * 9 + num - 1]
+        for j in range(node, node + 4):
+            col = self.column[j]
+            if self.left[self.right[col]] != col:
+                return False
+            self.cover(col)
+        return True
+
+    def search(self, max_solutions):
+        right, down, column, size = self.right, self.down, self.column, self.size
+        self.nodes += 1
+        if right[0] == 0:
+            self.solutions_count += 1
+            return self.solutions_count >= max_solutions
+
+        col, best = 0, 10
+        c = right[0]
+        while c != 0:
+            if size[c] < best:
+                col, best = c, size[c]
+                if best <= 1:
+                    break
+            c = right[c]
+        if best == 0:
+            return False
+
+        self.cover(col)
+        r = down[col]
+        while r != col:
+            j = right[r]
+            while j != r:
+                self.cover(column[j])
+                j = right[j]
+            if self.search(max_solutions):
+                return True
+            j = self.left[r]
+            while j != r:
+                self.uncover(column[j])
+                j = self.left[j]
+            r = down[r]
+        self.uncover(col)
+        return False
+
+
+def count_solutions(grid, max_solutions=2):
+    '''Counts solutions of a grid with DLX, stops as soon as
+    max_solutions are found.'''
+    matrix = DLXMatrix()
+    for row in range(9):
+        for col in range(9):
+            if grid[row][col] != 0 and not matrix.select(row * 9 + col, grid[row][col]):
+                return 0
+    matrix.search(max_solutions)
+    if telemetry.active is not None:
+        telemetry.active.count('solver_nodes', matrix.nodes)
+    return matrix.solutions_count
@@ -1,43 +1,81 @@
 import copy
+import math
+import os
 import random
 import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from utility import is_valid, copy_grid
-from grader import is_easy, is_medium
+from grader import is_medium, grade, ClueRemover, HARD_TECHNIQUES
+from bitboard import BitBoard
+import dlx
+import telemetry
+from cache import zobrist_table, zobrist_hash, uniqueness_cache
+from geometry import geometry
+from transform import equivalents
 
 
 class Board:
-    def __init__(self):
-        self.grid = [[0 for _ in range(9)] for _ in range(9)]
-        self.cells = [(r, c) for r in range(9) for c in range(9)]
+    def __init__(self, solver='bitmask', rng=None, size=9):
+        if solver == 'dlx' and size != 9:
+            raise ValueError('the dlx solver only handles 9x9 boards')
+        self.geometry = geometry(size)
+        self.size = size
+        self.zobrist = zobrist_table(size)
+        self.grid = [[0 for _ in range(size)] for _ in range(size)]
+        self.cells = [(r, c) for r in range(size) for c in range(size)]
         self.solutions_count = None
         self.empty_cells = None
         self.solution = None
+        self.solver = solver
+        self.rng = rng or random
+        self.nodes = 0
+
+    @property
+    def grid(self):
+        return self._grid
+
+    @grid.setter
+    def grid(self, grid):
+        self._grid = grid
+        self.hash = zobrist_hash(grid)
+
+    def set_cell(self, row, col, num):
+        '''Changes one cell and updates the Zobrist hash of the grid incrementally.'''
+        keys = self.zobrist[row * self.size + col]
+        self.hash ^= keys[self._grid[row][col]] ^ keys[num]
+        self._grid[row][col] = num
 
     def fill(self):
-        '''Recursively fills in the empty cells on a sudoku board,
-         backtracks if there is no valid number for a cell'''
-        for row in range(9):
-            for col in range(9):
-                if self.grid[row][col] == 0:
-                    nums = [a for a in range(1, 10)]
-                    random.shuffle(nums)
-                    for i in nums:
-                        if is_valid(self.grid, row, col, i):
-                            self.grid[row][col] = i
-                            if self.fill():
-                                return True
-                            self.grid[row][col] = 0
-
-                    return False
+        '''Fills in the empty cells on a sudoku board with random digits,
+         the bitmask solver backtracks if there is no valid number for a cell.
+         Above 9x9 the search gets a node budget and an empty board falls back
+         to a shuffled pattern grid, plain search rarely fills 25x25 at all.'''
+        empty = not any(num for row in self.grid for num in row)
+        if self.size > 16 and empty:
+            self.grid = pattern_solution(self.geometry, self.rng)
+            return True
+
+        board = BitBoard(self.grid)
+        solved = board.solve(self.rng, None if self.size == 9 else 20 * len(self.cells))
+        if telemetry.active is not None:
+            telemetry.active.count('fill_attempts')
+            telemetry.active.count('solver_nodes', board.nodes)
+        if not solved:
+            if not empty:
+                return False
+            self.grid = pattern_solution(self.geometry, self.rng)
+            return True
+        self.grid = board.to_grid()
         return True
 
     def get_empty_cells(self):
-        return [(r, c) for r in range(9) for c in range(9) if self.grid[r][c] == 0]
+        return [(r, c) for r, c in self.cells if self.grid[r][c] == 0]
 
-    def solve(self, index):
+    def solve(self, index, max_solutions=2):
         ''' Uses backtracking to find solutions of a sudoku board,
-         stops if more than one solution is found. '''
-        if self.solutions_count > 1:
+         stops once max_solutions are found. '''
+        self.nodes += 1
+        if self.solutions_count >= max_solutions:
             return
 
         if index == len(self.empty_cells):
@@ -45,34 +83,37 @@ class Board:
             return
 
         row, col = self.empty_cells[index]
-        for num in range(1, 10):
+        for num in range(1, self.size + 1):
             if is_valid(self.grid, row, col, num):
                 self.grid[row][col] = num
-                self.solve(index + 1)
+                self.solve(index + 1, max_solutions)
                 self.grid[row][col] = 0
 
     def uniqueness_check(self):
-        backup = copy_grid(self.grid)
-        self.empty_cells = self.get_empty_cells()
-        self.solutions_count = 0
-        self.solve(0)
-        self.grid = backup
+        if telemetry.active is not None:
+            telemetry.active.count('uniqueness_checks')
+        count = uniqueness_cache.get(self.hash)
+        if count is None:
+            count = SOLVERS[self.solver](self.grid, 2)
+            uniqueness_cache.put(self.hash, count)
+        self.solutions_count = count
         return self.solutions_count == 1
 
     def remove_clues_easy(self, target_removal):
-        '''Greedy approach'''
-        cells = [(r, c) for r in range(9) for c in range(9)]
-        random.shuffle(cells)
+        '''Greedy approach, the remover keeps its state across removals and
+        only accepts removals that keep the puzzle solvable with singles,
+        which also guarantees uniqueness.'''
+        cells = list(self.cells)
+        self.rng.shuffle(cells)
+        remover = ClueRemover(self.grid)
         removed = 0
 
         for row, col in cells:
             if self.grid[row][col] == 0:
                 continue
-            backup = self.grid[row][col]
-            self.grid[row][col] = 0
-            if not self.uniqueness_check() or not is_easy(self.grid):
-                self.grid[row][col] = backup
+            if not remover.try_remove(row * self.size + col):
                 continue
+            self.set_cell(row, col, 0)
 
             removed += 1
             if removed >= target_removal:
@@ -86,18 +127,20 @@ class Board:
 
         backup = copy_grid(self.grid)
 
-        for _ in range(max_tries):
+        for attempt in range(max_tries):
+            if attempt and telemetry.active is not None:
+                telemetry.active.count('retries')
             self.grid = copy_grid(backup)
             removed = 0
 
-            for r, c in random.sample(self.cells, 81):
+            for r, c in self.rng.sample(self.cells, len(self.cells)):
                 if self.grid[r][c] == 0:
                     continue
 
                 clue = self.grid[r][c]
-                self.grid[r][c] = 0
+                self.set_cell(r, c, 0)
                 if not self.uniqueness_check():
-                    self.grid[r][c] = clue
+                    self.set_cell(r, c, clue)
                     continue
 
                 removed += 1
@@ -109,16 +152,262 @@ class Board:
         return False
 
 
-def generate_puzzle(difficulty):
-    board = Board()
+    def remove_clues_guided(self, difficulty, target_removal, max_steps):
+        '''Simulated annealing towards a puzzle grading as difficulty. Clues are
+        first removed in random order while the puzzle stays unique, then removed
+        and kept clues are swapped; a swap is kept when it brings the grade closer
+        to the difficulty band, or occasionally when it does not while the
+        temperature is still high. Stops after max_steps swaps, self.distance
+        is the final distance.'''
+        removed = []
+        for r, c in self.rng.sample(self.cells, len(self.cells)):
+            if len(removed) >= target_removal:
+                break
+            clue = self.grid[r][c]
+            self.set_cell(r, c, 0)
+            if self.uniqueness_check():
+                removed.append((r, c, clue))
+            else:
+                self.set_cell(r, c, clue)
+        if len(removed) < target_removal:
+            self.distance = difficulty_distance(grade(self.grid), difficulty)
+            return self.distance == 0
+
+        distance = difficulty_distance(grade(self.grid), difficulty)
+        for step in range(max_steps):
+            if distance == 0:
+                break
+
+            k = self.rng.randrange(len(removed))
+            restored_r, restored_c, restored = removed[k]
+            self.set_cell(restored_r, restored_c, restored)
+            r, c = self.rng.choice([(r, c) for r, c in self.cells if self.grid[r][c] and (r, c) != (restored_r, restored_c)])
+            clue = self.grid[r][c]
+            self.set_cell(r, c, 0)
+
+            if self.uniqueness_check():
+                new_distance = difficulty_distance(grade(self.grid), difficulty)
+                temperature = 1.0 - step / max_steps
+                if new_distance <= distance or self.rng.random() < math.exp((distance - new_distance) / temperature):
+                    removed[k] = (r, c, clue)
+                    distance = new_distance
+                    continue
+
+            self.set_cell(r, c, clue)
+            self.set_cell(restored_r, restored_c, 0)
+
+        self.distance = distance
+        return distance == 0
+
+    def remove_clues_logical(self, difficulty, max_grades):
+        '''Removal for boards above 9x9, where solver based uniqueness checks get
+        too slow; a puzzle the grader solves is unique. Clues are visited in random
+        order and removed when singles still solve the puzzle, otherwise removed
+        when the grader still solves it without going past the difficulty. While
+        the puzzle grades short of the band only immediate singles skip grading. Then
+        the remaining clues are graded the same way, pass after pass, until the
+        puzzle grades as difficulty. Stops after max_grades graded removals,
+        self.distance is the final distance.'''
+        cells = self.rng.sample(self.cells, len(self.cells))
+        remover = ClueRemover(self.grid)
+        self.distance = None
+        grades = 0
+
+        def graded(r, c):
+            nonlocal grades
+            grades += 1
+            clue = self.grid[r][c]
+            self.set_cell(r, c, 0)
+            report = grade(self.grid)
+            if is_past_band(report, difficulty):
+                self.set_cell(r, c, clue)
+                return False
+            self.distance = difficulty_distance(report, difficulty)
+            return True
+
+        for r, c in cells:
+            index = r * self.size + c
+            # while short of the band most clues need grading anyway, singles from scratch rarely help
+            if remover.try_remove(index, not self.distance):
+                self.set_cell(r, c, 0)
+            elif self.distance != 0 and grades < max_grades and graded(r, c):
+                remover.clear(index)
+
+        while self.distance != 0 and grades < max_grades:
+            clues = [(r, c) for r, c in self.cells if self.grid[r][c]]
+            removed = False
+            for r, c in self.rng.sample(clues, len(clues)):
+                if self.distance == 0 or grades >= max_grades:
+                    break
+                if graded(r, c):
+                    removed = True
+            if not removed:
+                break
+
+        self.distance = difficulty_distance(grade(self.grid), difficulty)
+        return self.distance == 0
+
+
+def difficulty_distance(report, difficulty):
+    '''How far a grade is from the difficulty, 0 inside its band. Puzzles the
+    grader can not solve or that need harder techniques count as far too hard.'''
+    if not report.solved:
+        return 10
+    if difficulty == 'Easy':
+        return 0 if report.is_easy else 1 + report.rating
+    if difficulty == 'Medium':
+        if report.hardest in HARD_TECHNIQUES:
+            return 10
+        return max(0, 2 - report.rating, report.rating - report.medium_limit)
+    return 0 if report.is_hard else max(1, report.medium_limit + 1 - report.rating)
+
+
+def is_past_band(report, difficulty):
+    '''True when the grader can not solve the puzzle or it grades harder than
+    the difficulty, removing more clues can not bring it back.'''
+    if not report.solved:
+        return True
+    if difficulty == 'Easy':
+        return not report.is_easy
+    if difficulty == 'Medium':
+        return report.hardest in HARD_TECHNIQUES or report.rating > report.medium_limit
+    return False
+
+
+def pattern_solution(geometry, rng):
+    '''A random complete grid found without search: the shifted pattern where
+    cell (r, c) holds (box * (r % box) + r // box + c) % N, with the digits
+    relabelled, bands, stacks and the lines inside them permuted and
+    transposed half of the time.'''
+    box, n = geometry.box, geometry.size
+
+    def order():
+        return [band * box + line for band in rng.sample(range(box), box) for line in rng.sample(range(box), box)]
+
+    rows, cols = order(), order()
+    digits = rng.sample(range(1, n + 1), n)
+    grid = [[digits[(box * (r % box) + r // box + c) % n] for c in cols] for r in rows]
+    if rng.random() < 0.5:
+        grid = [list(column) for column in zip(*grid)]
+    return grid
+
+
+def count_solutions_backtracking(grid, max_solutions=2):
+    board = Board(size=len(grid))
+    board.grid = copy_grid(grid)
+    board.empty_cells = board.get_empty_cells()
+    board.solutions_count = 0
+    board.solve(0, max_solutions)
+    if telemetry.active is not None:
+        telemetry.active.count('solver_nodes', board.nodes)
+    return board.solutions_count
+
+
+def count_solutions_bitmask(grid, max_solutions=2):
+    board = BitBoard(grid)
+    count = board.count_solutions(max_solutions)
+    if telemetry.active is not None:
+        telemetry.active.count('solver_nodes', board.nodes)
+    return count
+
+
+SOLVERS = {'backtracking': count_solutions_backtracking,
+           'bitmask': count_solutions_bitmask,
+           'dlx': dlx.count_solutions}
+
+GUIDED_ATTEMPTS = 6
+LOGICAL_ATTEMPTS = 3
+
+
+def generate_puzzle(difficulty, rng=None, size=9):
+    '''Generates a size x size puzzle and its solution. Clue counts are chosen
+    as the same share of the cells as on the 9x9 board. Medium and Hard try at
+    most GUIDED_ATTEMPTS solution grids (LOGICAL_ATTEMPTS above 9x9); when none
+    of them gets into the difficulty band, the unique puzzle graded closest to
+    it is returned.'''
+    board = Board(rng=rng, size=size)
     board.fill()
     board.solution = copy_grid(board.grid)
+    cells = len(board.cells)
+
+    def removals(low, high):
+        return board.rng.randint(low * cells // 81, high * cells // 81)
+
+    def refill():
+        if telemetry.active is not None:
+            telemetry.active.count('refills')
+        board.grid = [[0 for _ in range(size)] for _ in range(size)]
+        board.fill()
+        board.solution = copy_grid(board.grid)
+
+    def bounded(attempts, remove):
+        # bounded number of fills, the puzzle closest to the band if none gets into it
+        best = None
+        for attempt in range(attempts):
+            if attempt:
+                refill()
+            if remove():
+                return
+            if best is None or board.distance < best[0]:
+                best = (board.distance, copy_grid(board.grid), board.solution)
+        if telemetry.active is not None:
+            telemetry.active.count('fallbacks')
+        _, board.grid, board.solution = best
+
     if difficulty == 'Easy':
-        board.remove_clues_easy(random.randint(38, 45))
+        board.remove_clues_easy(removals(38, 45))
+    elif size > 9:
+        bounded(LOGICAL_ATTEMPTS, lambda: board.remove_clues_logical(difficulty, cells // 2))
     elif difficulty == 'Medium':
-        while not board.remove_clues_medium(random.randint(48, 53), 50):
-            board.grid = [[0 for _ in range(9)] for _ in range(9)]
-            board.fill()
-            board.solution = copy_grid(board.grid)
+        bounded(GUIDED_ATTEMPTS, lambda: board.remove_clues_guided('Medium', removals(48, 53), 150))
+    elif difficulty == 'Hard':
+        bounded(GUIDED_ATTEMPTS, lambda: board.remove_clues_guided('Hard', removals(54, 58), 80))
 
     return board.grid, board.solution
+
+
+def generate_seeded(difficulty, seed, size=9):
+    return generate_puzzle(difficulty, random.Random(seed), size)
+
+
+def generate_graded(difficulty, seed, size=9):
+    '''generate_seeded with the grade report of the puzzle. Its difficulty is
+    not the requested one when no attempt got into the band and the closest
+    puzzle was returned, which telemetry also counts as a fallback.'''
+    grid, solution = generate_seeded(difficulty, seed, size)
+    return grid, solution, grade(grid)
+
+
+def generate_puzzles(difficulty, count, workers=None, seed=None, variants=1, size=9):
+    '''Generates count puzzles on a process pool and yields (index, grid, solution)
+    as each puzzle finishes. Every puzzle gets its own seed drawn from seed,
+    so a batch is reproducible regardless of worker count or finishing order.
+    With variants > 1 each generated puzzle is expanded into that many
+    equivalent puzzles by symmetry transformations instead of generating them,
+    which is only available for 9x9 boards.'''
+    if variants > 1 and size != 9:
+        raise ValueError('symmetry variants are only available for 9x9 boards')
+    workers = workers or os.cpu_count() or 1
+    seeds = random.Random(seed)
+    bases = -(-count // variants)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = 2 * workers
+        pending = {}
+        base = 0
+        while base < bases or pending:
+            while base < bases and len(pending) < in_flight:
+                puzzle_seed = seeds.getrandbits(64)
+                future = executor.submit(generate_seeded, difficulty, puzzle_seed, size)
+                pending[future] = (base, puzzle_seed)
+                base += 1
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, puzzle_seed = pending.pop(future)
+                grid, solution = future.result()
+                if variants == 1:
+                    yield index, grid, solution
+                    continue
+                puzzles = equivalents(grid, solution, seed=puzzle_seed, count=min(variants, count - index * variants))
+                for k, (variant, variant_solution) in enumerate(puzzles):
+                    yield index * variants + k, variant, variant_solution
@@ -0,0 +1,89 @@
+'''Board geometry of an N x N Sudoku with square boxes (N = 9, 16, 25, ...).
+
+Cells are numbered row by row from 0 to N * N - 1. Units are the N rows, the N
+columns and the N boxes in that order, and digit d is bit d - 1 of a candidate
+mask. Cell sets are bitsets over all cells (Python ints of N * N bits). The
+tables for every size are built once and shared.'''
+
+import math
+
+SYMBOLS = '123456789ABCDEFGHIJKLMNOP'
+
+
+class MaskTable(dict):
+    '''Lookup table for masks too wide to tabulate in full, entries are
+    computed on first use and kept.'''
+
+    def __init__(self, func):
+        super().__init__()
+        self.func = func
+
+    def __missing__(self, mask):
+        value = self[mask] = self.func(mask)
+        return value
+
+
+class Geometry:
+    def __init__(self, box):
+        n = box * box
+        self.box = box
+        self.size = n
+        self.cell_count = n * n
+        self.all_digits = (1 << n) - 1
+        self.symbols = SYMBOLS[:n]
+
+        self.box_of = [box * (i // (n * box)) + (i % n) // box for i in range(n * n)]
+        self.units = ([[row * n + col for col in range(n)] for row in range(n)] +
+                      [[row * n + col for row in range(n)] for col in range(n)] +
+                      [[(start_row + row) * n + start_col + col for row in range(box) for col in range(box)]
+                       for start_row in range(0, n, box) for start_col in range(0, n, box)])
+        self.cell_units = [[] for _ in range(n * n)]
+        for u, unit in enumerate(self.units):
+            for pos, i in enumerate(unit):
+                self.cell_units[i].append((u, pos))
+        self.peers = [sorted({j for u, _ in self.cell_units[i] for j in self.units[u]} - {i}) for i in range(n * n)]
+        self.peer_masks = [sum(1 << j for j in self.peers[i]) for i in range(n * n)]
+
+        # positions inside a box unit (or a line) as masks: the box rows, the box columns
+        self.row_segments = tuple(((1 << box) - 1) << (box * k) for k in range(box))
+        self.col_segments = tuple(sum(1 << (box * j + k) for j in range(box)) for k in range(box))
+
+        def digits(mask):
+            return tuple(d + 1 for d in range(n) if mask >> d & 1)
+
+        if n <= 9:
+            self.popcount = [bin(mask).count('1') for mask in range(1 << n)]
+            self.digits = [digits(mask) for mask in range(1 << n)]
+        else:
+            self.popcount = MaskTable(lambda mask: bin(mask).count('1'))
+            self.digits = MaskTable(digits)
+
+    def symbol(self, num):
+        return self.symbols[num - 1] if num else '.'
+
+    def value(self, symbol):
+        '''Digit of a symbol, 0 for '.' and '0', None for anything else.'''
+        if symbol in '.0':
+            return 0
+        index = self.symbols.find(symbol.upper())
+        return index + 1 if index >= 0 else None
+
+
+_geometries = {}
+
+
+def geometry(size=9):
+    '''Shared Geometry of a size x size board, size must be a square.'''
+    if size not in _geometries:
+        box = int(round(math.sqrt(size)))
+        if box * box != size or not 2 <= box <= 5:
+            raise ValueError('unsupported board size %r' % size)
+        _geometries[size] = Geometry(box)
+    return _geometries[size]
+
+
+def geometry_of(grid):
+    return geometry(len(grid))
+
+
+CLASSIC = geometry(9)
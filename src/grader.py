@@ -1,99 +1,167 @@
 import copy
-from utility import is_valid, is_filled, copy_grid
+import heapq
+from geometry import CLASSIC, geometry_of
 from itertools import combinations
+import time
+import telemetry
+from cache import zobrist_hash, grade_cache
+
+ROW_SEGMENTS = CLASSIC.row_segments
+COL_SEGMENTS = CLASSIC.col_segments
+
 
 class Sudoku:
-    def __init__(self):
+    def __init__(self, geometry=CLASSIC):
         self.grid = None
-        self.candidates_grid = None
-        self.rows = [[(row, col) for col in range(9)] for row in range(9)]
-        self.columns = [[(row, col) for row in range(9)] for col in range(9)]
-        self.boxes = [[(row, col) for row in range(start_row, start_row + 3) for col in range(start_col, start_col + 3)]
-                      for start_row in [0, 3, 6] for start_col in [0, 3, 6]]
-        self.units = self.rows + self.columns + self.boxes
+        self.candidates = None
+        self.positions = None
+        self.singles = None
+        self.unit_versions = None
+        self.version = 0
+        self.clean_units = None
+        self.clean_versions = None
+        self.geometry = geometry
+        self.size = n = geometry.size
+        self.all_digits = geometry.all_digits
+        self.popcount = geometry.popcount
+        self.digits = geometry.digits
+        self.cell_units = geometry.cell_units
+        self.peers = geometry.peers
+        self.peer_masks = geometry.peer_masks
+        self.units = geometry.units
+        self.rows = self.units[:n]
+        self.columns = self.units[n:2 * n]
+        self.boxes = self.units[2 * n:]
 
         self.easy_strategies = [(0, self.naked_singles), (0, self.hidden_singles)]
         self.medium_strategies = self.easy_strategies + [(1, self.naked_pairs), (2, self.hidden_pairs),
                            (2, self.naked_triples), (3, self.hidden_triples),
                            (2, self.locked_candidates_pointing), (2, self.locked_candidates_claiming)]
+        self.hard_strategies = self.medium_strategies + [(4, self.x_wing), (4, self.xy_wing),
+                           (5, self.swordfish), (5, self.xyz_wing), (6, self.simple_coloring)]
 
     def initialize_candidates_grid(self):
-        '''Initializes 9*9 grid of cells listing potential candidates
-        that can be validly placed in each.'''
-        candidates = [[set() for _ in range(9)] for _ in range(9)]
-        for row in range(9):
-            for col in range(9):
-                if self.grid[row][col] == 0:
-                    candidates[row][col] = {num for num in range(1, 10) if is_valid(self.grid, row, col, num)}
-        self.candidates_grid = candidates
-
-    def basic_update(self, row, col, num):
-        '''Updates the grid of candidates after cell was filled - row,column and box.'''
-        for i in range(9):
-            self.candidates_grid[row][i].discard(num)
-            self.candidates_grid[i][col].discard(num)
-
-        start_row, start_col = 3 * (row // 3), 3 * (col // 3)
-        for r in range(start_row, start_row + 3):
-            for c in range(start_col, start_col + 3):
-                self.candidates_grid[r][c].discard(num)
+        '''Initializes an N-bit candidate mask for each of the N * N cells and for
+        each unit a mask of positions per digit where that digit can still go.'''
+        cell_units, popcount, digits = self.cell_units, self.popcount, self.digits
+        used = [0] * len(self.units)
+        for i, num in enumerate(self.grid):
+            if num:
+                for u, _ in cell_units[i]:
+                    used[u] |= 1 << (num - 1)
+
+        self.candidates = [0] * len(self.grid)
+        self.positions = [[0] * self.size for _ in self.units]
+        self.singles = []
+        self.unit_versions = [0] * len(self.units)
+        self.version = 0
+        self.clean_units = {}
+        self.clean_versions = {}
+        for i, num in enumerate(self.grid):
+            if num:
+                continue
+            (r, _), (c, _), (b, _) = cell_units[i]
+            mask = self.all_digits & ~(used[r] | used[c] | used[b])
+            self.candidates[i] = mask
+            if popcount[mask] == 1:
+                self.singles.append(i)
+            for u, pos in cell_units[i]:
+                positions = self.positions[u]
+                for num in digits[mask]:
+                    positions[num - 1] |= 1 << pos
+
+    def eliminate(self, index, mask):
+        '''Removes candidates in mask from a cell, returns True if any were present.'''
+        mask &= self.candidates[index]
+        if not mask:
+            return False
+        remaining = self.candidates[index] ^ mask
+        self.candidates[index] = remaining
+        for u, pos in self.cell_units[index]:
+            positions = self.positions[u]
+            for num in self.digits[mask]:
+                positions[num - 1] &= ~(1 << pos)
+            self.unit_versions[u] += 1
+        self.version += 1
+        if self.popcount[remaining] == 1:
+            heapq.heappush(self.singles, index)
+        return True
+
+    def dirty_units(self, name, units):
+        '''Yields the units that changed since the strategy last scanned them
+        without progress. Asking for the next unit marks the previous one as
+        scanned clean; a strategy that makes progress returns before that.'''
+        clean = self.clean_units.setdefault(name, [-1] * len(self.units))
+        versions = self.unit_versions
+        for u in units:
+            version = versions[u]
+            if clean[u] != version:
+                yield u
+                clean[u] = version
+
+    def unchanged_since_scan(self, name):
+        '''For strategies looking at the whole grid: True if nothing changed since
+        the strategy last ran without progress.'''
+        return self.clean_versions.get(name) == self.version
+
+    def mark_scanned(self, name):
+        self.clean_versions[name] = self.version
+        return False
+
+    def place(self, index, num):
+        self.grid[index] = num
+        self.eliminate(index, self.candidates[index])
+        self.basic_update(index, num)
+
+    def basic_update(self, index, num):
+        '''Updates the candidates after cell was filled - row,column and box.'''
+        bit = 1 << (num - 1)
+        for peer in self.peers[index]:
+            if self.candidates[peer] & bit:
+                self.eliminate(peer, bit)
 
     def naked_singles(self):
         '''Finds cells where only one candidate is available
-         and fills them in.'''
-        for row in range(9):
-            for col in range(9):
-                if self.grid[row][col] == 0 and len(self.candidates_grid[row][col]) == 1:
-                    num = self.candidates_grid[row][col].pop()
-                    self.grid[row][col] = num
-                    self.basic_update(row, col, num)
-                    return True
+         and fills them in. Cells are taken from a queue of cells whose
+         candidates dropped to one, lowest index first.'''
+        while self.singles:
+            index = heapq.heappop(self.singles)
+            mask = self.candidates[index]
+            if self.grid[index] == 0 and self.popcount[mask] == 1:
+                self.place(index, self.digits[mask][0])
+                return True
         return False
 
     def hidden_singles(self):
         '''Finds candidates that appear in only one cell
          in a unit(row,column,box) and fills them in.'''
-        for unit in self.units:
-            possible_positions = {num: [] for num in range(1, 10)}
-            for row, col in unit:
-                if self.grid[row][col] != 0:
-                    continue
-                for candidate in self.candidates_grid[row][col]:
-                    possible_positions[candidate].append((row, col))
-                    
-            for num, positions in possible_positions.items():
-                if len(positions) == 1:
-                    row, col = positions[0]
-                    self.grid[row][col] = num
-                    self.candidates_grid[row][col].clear()
-                    self.basic_update(row, col, num)
+        popcount = self.popcount
+        for u in self.dirty_units('hidden_singles', range(len(self.units))):
+            unit, positions = self.units[u], self.positions[u]
+            for num in range(1, self.size + 1):
+                mask = positions[num - 1]
+                if popcount[mask] == 1:
+                    self.place(unit[mask.bit_length() - 1], num)
                     return True
-                    
         return False
 
     def naked_pairs(self):
         '''Finds two cells in a unit that have only the same two candidates and
          removes those candidates from other cells in the unit.'''
-        progress = False
-        for unit in self.units:
+        for u in self.dirty_units('naked_pairs', range(len(self.units))):
+            unit = self.units[u]
             pair_map = {}
-            for row, col in unit:
-                if len(self.candidates_grid[row][col]) == 2:
-                    pair = tuple(sorted(self.candidates_grid[row][col]))
-                    if pair not in pair_map:
-                        pair_map[pair] = []
-                    pair_map[pair].append((row, col))
+            for index in unit:
+                mask = self.candidates[index]
+                if self.popcount[mask] == 2:
+                    pair_map.setdefault(mask, []).append(index)
 
             for pair, cells in pair_map.items():
                 if len(cells) == 2:
-                    num1, num2 = pair
-                    for row, col in unit:
-                        if (row, col) not in cells:
-                            old = self.candidates_grid[row][col].copy()
-                            self.candidates_grid[row][col].discard(num1)
-                            self.candidates_grid[row][col].discard(num2)
-                            if self.candidates_grid[row][col] != old:
-                                progress = True
+                    progress = False
+                    for index in unit:
+                        if index not in cells and self.eliminate(index, pair):
+                            progress = True
                     if progress:
                         return True
         return False
@@ -101,169 +169,425 @@ class Sudoku:
     def hidden_pairs(self):
         '''Finds two candidates that are only in the same two cells in a unit and
         removes other candidates those cells.'''
-        for unit in self.units:
-            number_positions = {num: [] for num in range(1, 10)}
-            for row, col in unit:
-                for num in self.candidates_grid[row][col]:
-                    number_positions[num].append((row, col))
-
-            for num1 in range(1, 9):
-                positions1 = number_positions[num1]
-                if len(positions1) != 2:
+        n = self.size
+        for u in self.dirty_units('hidden_pairs', range(len(self.units))):
+            unit, positions = self.units[u], self.positions[u]
+            for num1 in range(1, n):
+                positions1 = positions[num1 - 1]
+                if self.popcount[positions1] != 2:
                     continue
 
-                for num2 in range(num1 + 1, 10):
-                    positions2 = number_positions[num2]
-                    if positions2 == positions1:
-                        row1, col1 = positions1[0]
-                        row2, col2 = positions1[1]
-                        if len(self.candidates_grid[row1][col1]) > 2 or len(self.candidates_grid[row2][col2]) > 2:
-                            self.candidates_grid[row1][col1] = {num1, num2}
-                            self.candidates_grid[row2][col2] = {num1, num2}
+                for num2 in range(num1 + 1, n + 1):
+                    if positions[num2 - 1] == positions1:
+                        pair = (1 << (num1 - 1)) | (1 << (num2 - 1))
+                        cells = [unit[pos] for pos in range(n) if positions1 >> pos & 1]
+                        progress = False
+                        for index in cells:
+                            if self.eliminate(index, ~pair):
+                                progress = True
+                        if progress:
                             return True
         return False
 
     def naked_triples(self):
         '''Finds three cells in a unit that share the same three candidates and
         removes those candidates from other cells in the unit.'''
-        progress = False
-        for unit in self.units:
-            unsolved = [(row, col) for row, col in unit if 3 >= len(self.candidates_grid[row][col]) > 1]
+        popcount = self.popcount
+        for u in self.dirty_units('naked_triples', range(len(self.units))):
+            unit = self.units[u]
+            unsolved = [index for index in unit if 3 >= popcount[self.candidates[index]] > 1]
             for triple in combinations(unsolved, 3):
-                union = set.union(*(self.candidates_grid[row][col] for row, col in triple))
-                if len(union) == 3:
-                    for row, col in unit:
-                        if (row, col) not in triple:
-                            if union.intersection(self.candidates_grid[row][col]):
-                                progress = True
-                                self.candidates_grid[row][col] -= union
+                union = self.candidates[triple[0]] | self.candidates[triple[1]] | self.candidates[triple[2]]
+                if popcount[union] == 3:
+                    progress = False
+                    for index in unit:
+                        if index not in triple and self.eliminate(index, union):
+                            progress = True
                     if progress:
                         return True
-
         return False
 
     def hidden_triples(self):
         '''Finds three candidates that are only in the same three cells 
         in a unit and removes other candidates those cells.'''
-        progress = False
-        for unit in self.units:
-            number_positions = {num: [] for num in range(1, 10)}
-            for row, col in unit:
-                for num in self.candidates_grid[row][col]:
-                    number_positions[num].append((row, col))
-
-            for a,b,c in combinations(range(1, 10), 3):
-                if not (2 <= len(number_positions[a]) <= 3): continue
-                if not (2 <= len(number_positions[b]) <= 3): continue
-                if not (2 <= len(number_positions[c]) <= 3): continue
-                shared_cells = (set(number_positions[a]) & set(number_positions[b]) & set(number_positions[c]))
-                if len(shared_cells) == 3:
-                    for row, col in shared_cells:
-                        extras = self.candidates_grid[row][col] - set([a,b,c])
-                        if extras:
+        n, popcount = self.size, self.popcount
+        for u in self.dirty_units('hidden_triples', range(len(self.units))):
+            unit, positions = self.units[u], self.positions[u]
+            digits = [num for num in range(1, n + 1) if 2 <= popcount[positions[num - 1]] <= 3]
+            for a, b, c in combinations(digits, 3):
+                shared = positions[a - 1] & positions[b - 1] & positions[c - 1]
+                if popcount[shared] == 3:
+                    triple = (1 << (a - 1)) | (1 << (b - 1)) | (1 << (c - 1))
+                    progress = False
+                    for pos in range(n):
+                        if shared >> pos & 1 and self.eliminate(unit[pos], ~triple):
                             progress = True
-                            self.candidates_grid[row][col] -= extras
                     if progress:
                         return True
-
         return False
 
     def locked_candidates_pointing(self):
         ''' Checks positions of candidate in every box unit,
          if a candidate is in only one row/col removes the 
          candidate from cells inside the row/col and outside the box unit. '''
-        progress = False
-        for box in self.boxes:
-            for num in range(1, 10):
-                positions = [(row, col) for row, col in box if num in self.candidates_grid[row][col]]
-                if not positions:
+        n, size = self.size, self.geometry.box
+        row_segments, col_segments = self.geometry.row_segments, self.geometry.col_segments
+        for u in self.dirty_units('locked_candidates_pointing', range(2 * n, 3 * n)):
+            box = u - 2 * n
+            box_row, box_col = size * (box // size), size * (box % size)
+            for num in range(1, n + 1):
+                mask = self.positions[u][num - 1]
+                if not mask:
                     continue
 
-                rows = {row for row, _ in positions}
-                if len(rows) == 1:
-                    row = rows.pop()
-                    for col in range(9):
-                        if (row, col) not in box and num in self.candidates_grid[row][col]:
-                            self.candidates_grid[row][col].remove(num)
-                            progress = True
-                    if progress:
-                        return True
-
-                cols = {col for _, col in positions}
-                if len(cols) == 1:
-                    col = cols.pop()
-                    for row in range(9):
-                        if (row, col) not in box and num in self.candidates_grid[row][col]:
-                            self.candidates_grid[row][col].remove(num)
-                            progress = True
+                for k in range(size):
+                    if not mask & ~row_segments[k]:
+                        if self.eliminate_outside(box_row + k, num, row_segments[box_col // size]):
+                            return True
 
-                    if progress:
-                        return True
+                for k in range(size):
+                    if not mask & ~col_segments[k]:
+                        if self.eliminate_outside(n + box_col + k, num, row_segments[box_row // size]):
+                            return True
         return False
 
     def locked_candidates_claiming(self):
         ''' Checks candidate positions in every row/col, if candidate positions
         in a row/col are only in one box unit removes the candidate from
         cells inside the box unit and outside the row/col'''
-        progress = False
-        for unit in self.rows + self.columns:
-            for num in range(1, 10):
-                positions = [(row, col) for row, col in unit if num in self.candidates_grid[row][col]]
-                if not positions:
+        n, size = self.size, self.geometry.box
+        row_segments, col_segments = self.geometry.row_segments, self.geometry.col_segments
+        for u in self.dirty_units('locked_candidates_claiming', range(2 * n)):
+            line = u % n
+            for num in range(1, n + 1):
+                mask = self.positions[u][num - 1]
+                if not mask:
                     continue
 
-                boxes = {(row // 3, col // 3) for row, col in positions}
-                if len(boxes) == 1:
-                    a, b = boxes.pop()
-                    for row in range(a * 3, a * 3 + 3):
-                        for col in range(b * 3, b * 3 + 3):
-                            if (row, col) not in unit and num in self.candidates_grid[row][col]:
-                                self.candidates_grid[row][col].remove(num)
-                                progress = True
-                    if progress:
-                        return True
+                for k in range(size):
+                    if not mask & ~row_segments[k]:
+                        if u < n:
+                            box, inside = size * (line // size) + k, row_segments[line % size]
+                        else:
+                            box, inside = size * k + line // size, col_segments[line % size]
+                        if self.eliminate_outside(2 * n + box, num, inside):
+                            return True
         return False
 
-
-def is_easy(puzzle):
-    sudoku = Sudoku()
-    backup = copy_grid(puzzle)
-    sudoku.grid = backup
-    sudoku.initialize_candidates_grid()
-
-    while True:
-        if sudoku.naked_singles():
-            continue
-        if sudoku.hidden_singles():
-            continue
-        break
-
-    if is_filled(sudoku.grid):
+    def eliminate_outside(self, u, num, inside):
+        '''Removes num from cells of unit u whose positions are not in the inside mask.'''
+        mask = self.positions[u][num - 1] & ~inside
+        if not mask:
+            return False
+        bit = 1 << (num - 1)
+        for pos in range(self.size):
+            if mask >> pos & 1:
+                self.eliminate(self.units[u][pos], bit)
         return True
-    return False
 
-def is_medium(puzzle):
-    sudoku = Sudoku()
-    backup = copy_grid(puzzle)
-    sudoku.grid = backup
+    def eliminate_cells(self, cells, num):
+        '''Removes num from every cell in a cell bitset, returns True if any had it.'''
+        bit = 1 << (num - 1)
+        progress = False
+        while cells:
+            low = cells & -cells
+            if self.eliminate(low.bit_length() - 1, bit):
+                progress = True
+            cells ^= low
+        return progress
+
+    def fish(self, size):
+        '''Finds size rows (columns) where a candidate is limited to the same size
+        columns (rows) and removes it from the rest of those columns (rows).'''
+        n, popcount = self.size, self.popcount
+        for base, cover in ((0, n), (n, 0)):
+            for num in range(1, n + 1):
+                lines = [line for line in range(n) if 2 <= popcount[self.positions[base + line][num - 1]] <= size]
+                for fish in combinations(lines, size):
+                    union = 0
+                    for line in fish:
+                        union |= self.positions[base + line][num - 1]
+                    if popcount[union] != size:
+                        continue
+                    inside = sum(1 << line for line in fish)
+                    progress = False
+                    for pos in range(n):
+                        if union >> pos & 1 and self.eliminate_outside(cover + pos, num, inside):
+                            progress = True
+                    if progress:
+                        return True
+        return False
+
+    def x_wing(self):
+        '''Two rows/columns where a candidate fits only in the same two columns/rows.'''
+        if self.unchanged_since_scan('x_wing'):
+            return False
+        return self.fish(2) or self.mark_scanned('x_wing')
+
+    def swordfish(self):
+        '''Three rows/columns where a candidate fits only in the same three columns/rows.'''
+        if self.unchanged_since_scan('swordfish'):
+            return False
+        return self.fish(3) or self.mark_scanned('swordfish')
+
+    def xy_wing(self):
+        '''Finds a pivot cell {x,y} seeing wings {x,z} and {y,z}, one of the
+        wings must be z so z is removed from cells seeing both wings.'''
+        if self.unchanged_since_scan('xy_wing'):
+            return False
+        candidates, popcount, peer_masks = self.candidates, self.popcount, self.peer_masks
+        for pivot in range(len(candidates)):
+            pivot_mask = candidates[pivot]
+            if popcount[pivot_mask] != 2:
+                continue
+            wings = [i for i in self.peers[pivot] if popcount[candidates[i]] == 2
+                     and popcount[candidates[i] & pivot_mask] == 1]
+            for a, b in combinations(wings, 2):
+                z = candidates[a] & ~pivot_mask
+                if z == candidates[b] & ~pivot_mask and candidates[a] != candidates[b]:
+                    if self.eliminate_cells(peer_masks[a] & peer_masks[b], self.digits[z][0]):
+                        return True
+        return self.mark_scanned('xy_wing')
+
+    def xyz_wing(self):
+        '''Finds a pivot cell {x,y,z} seeing wings {x,z} and {y,z}, z is removed
+        from cells seeing the pivot and both wings.'''
+        if self.unchanged_since_scan('xyz_wing'):
+            return False
+        candidates, popcount, peer_masks = self.candidates, self.popcount, self.peer_masks
+        for pivot in range(len(candidates)):
+            pivot_mask = candidates[pivot]
+            if popcount[pivot_mask] != 3:
+                continue
+            wings = [i for i in self.peers[pivot] if popcount[candidates[i]] == 2
+                     and candidates[i] & pivot_mask == candidates[i]]
+            for a, b in combinations(wings, 2):
+                if candidates[a] | candidates[b] == pivot_mask:
+                    z = candidates[a] & candidates[b]
+                    cells = peer_masks[pivot] & peer_masks[a] & peer_masks[b]
+                    if self.eliminate_cells(cells, self.digits[z][0]):
+                        return True
+        return self.mark_scanned('xyz_wing')
+
+    def simple_coloring(self):
+        '''Colors chains of conjugate pairs (the only two places of a candidate in
+        a unit) alternately. A color appearing twice in a unit is false, and cells
+        seeing both colors can not hold the candidate.'''
+        if self.unchanged_since_scan('simple_coloring'):
+            return False
+        n, peer_masks = self.size, self.peer_masks
+        for num in range(1, n + 1):
+            links = {}
+            for unit, positions in zip(self.units, self.positions):
+                mask = positions[num - 1]
+                if self.popcount[mask] == 2:
+                    a, b = [unit[pos] for pos in range(n) if mask >> pos & 1]
+                    links.setdefault(a, []).append(b)
+                    links.setdefault(b, []).append(a)
+
+            colored = set()
+            for start in sorted(links):
+                if start in colored:
+                    continue
+                colors = {start: 0}
+                stack = [start]
+                while stack:
+                    cell = stack.pop()
+                    for other in links[cell]:
+                        if other not in colors:
+                            colors[other] = 1 - colors[cell]
+                            stack.append(other)
+                colored.update(colors)
+
+                groups = ([cell for cell, color in colors.items() if color == 0],
+                          [cell for cell, color in colors.items() if color == 1])
+                seen = [0, 0]
+                for color, cells in enumerate(groups):
+                    for cell in cells:
+                        seen[color] |= peer_masks[cell]
+                    if any(seen[color] >> cell & 1 for cell in cells):
+                        return self.eliminate_cells(sum(1 << cell for cell in cells), num)
+
+                if self.eliminate_cells(seen[0] & seen[1], num):
+                    return True
+        return self.mark_scanned('simple_coloring')
+
+
+class GradeReport:
+    '''Result of running the strategy ladder once over a puzzle: whether it was
+    solved, the hardest technique used, how often each technique fired and
+    the cumulative rating of the strategy weights. Ratings add up over the
+    steps of a solve, so the Medium band grows with the number of cells.'''
+
+    def __init__(self, solved, hardest, counts, rating, cells=81):
+        self.solved = solved
+        self.hardest = hardest
+        self.counts = counts
+        self.rating = rating
+        self.cells = cells
+
+    @property
+    def medium_limit(self):
+        return 10 * self.cells // 81
+
+    @property
+    def is_easy(self):
+        return self.solved and self.hardest in EASY_TECHNIQUES
+
+    @property
+    def is_medium(self):
+        return self.solved and self.hardest not in HARD_TECHNIQUES and 2 <= self.rating <= self.medium_limit
+
+    @property
+    def is_hard(self):
+        return self.solved and (self.hardest in HARD_TECHNIQUES or self.rating > self.medium_limit)
+
+    @property
+    def difficulty(self):
+        if self.is_easy:
+            return 'Easy'
+        if self.is_medium:
+            return 'Medium'
+        if self.is_hard:
+            return 'Hard'
+        return None
+
+    def as_dict(self):
+        return {'solved': self.solved, 'hardest': self.hardest, 'counts': dict(self.counts),
+                'rating': self.rating, 'difficulty': self.difficulty}
+
+
+EASY_TECHNIQUES = (None, 'naked_singles', 'hidden_singles')
+HARD_TECHNIQUES = ('x_wing', 'xy_wing', 'swordfish', 'xyz_wing', 'simple_coloring')
+
+
+def grade(puzzle):
+    '''Solves the puzzle once with the hard strategy ladder, always retrying
+    from the easiest strategy after one makes progress, and reports what it took.
+    Reports are cached by the Zobrist hash of the puzzle.'''
+    key = zobrist_hash(puzzle)
+    report = grade_cache.get(key)
+    if report is not None:
+        return report
+
+    sudoku = Sudoku(geometry_of(puzzle))
+    sudoku.grid = [num for row in puzzle for num in row]
     sudoku.initialize_candidates_grid()
+    stats = telemetry.active
+    if stats is not None:
+        stats.count('grader_calls')
+    counts = {}
     rating = 0
+    hardest, hardest_level = None, -1
 
     progress = True
     while progress:
         progress = False
-        for score, strategy in sudoku.medium_strategies:
-            if strategy():
+        for level, (score, strategy) in enumerate(sudoku.hard_strategies):
+            if stats is None:
+                hit = strategy()
+            else:
+                start = time.perf_counter()
+                hit = strategy()
+                stats.strategy(strategy.__name__, hit, time.perf_counter() - start)
+            if hit:
+                name = strategy.__name__
+                counts[name] = counts.get(name, 0) + 1
                 rating += score
+                if level > hardest_level:
+                    hardest, hardest_level = name, level
                 progress = True
                 break
 
-    if is_filled(sudoku.grid):
-        if 2 <= rating <= 10:
-            return True
-    return False
+    report = GradeReport(0 not in sudoku.grid, hardest, counts, rating, len(sudoku.grid))
+    grade_cache.put(key, report)
+    return report
 
+def solve_logically(puzzle):
+    '''Solves the puzzle with the hard strategy ladder like grade and returns
+    the solved grid, or None when the strategies get stuck. A grid filled by
+    deductions alone is the only solution of the puzzle.'''
+    sudoku = Sudoku(geometry_of(puzzle))
+    sudoku.grid = [num for row in puzzle for num in row]
+    sudoku.initialize_candidates_grid()
+    while any(strategy() for _, strategy in sudoku.hard_strategies):
+        pass
+    if 0 in sudoku.grid:
+        return None
+    n = sudoku.size
+    return [sudoku.grid[row * n:row * n + n] for row in range(n)]
 
+def is_easy(puzzle):
+    return grade(puzzle).is_easy
 
+def is_medium(puzzle):
+    return grade(puzzle).is_medium
+
+def is_hard(puzzle):
+    return grade(puzzle).is_hard
+
+
+class ClueRemover:
+    '''Removes clues one at a time from a puzzle that singles solve, keeping the
+    unit occupancy across steps. Singles reach the same fixpoint in any order, so the
+    reduced puzzle is still easy exactly when the removed clue can be deduced again;
+    after that the previous solve applies unchanged and nothing else is re-checked.
+    A puzzle solved by logic alone also has a unique solution.'''
+
+    def __init__(self, puzzle):
+        self.geometry = geometry_of(puzzle)
+        self.cell_units = self.geometry.cell_units
+        self.grid = [num for row in puzzle for num in row]
+        self.used = [0] * len(self.geometry.units)
+        for index, num in enumerate(self.grid):
+            if num:
+                for u, _ in self.cell_units[index]:
+                    self.used[u] |= 1 << (num - 1)
+
+    def candidates(self, index):
+        (r, _), (c, _), (b, _) = self.cell_units[index]
+        return self.geometry.all_digits & ~(self.used[r] | self.used[c] | self.used[b])
+
+    def try_remove(self, index, deduce=True):
+        '''Removes the clue at index if the puzzle stays solvable with singles,
+        otherwise leaves the puzzle unchanged. Returns whether it was removed.
+        Without deduce only an immediate single is accepted.'''
+        num = self.grid[index]
+        bit = 1 << (num - 1)
+        self.clear(index)
+
+        if self.is_single(index, bit) or deduce and self.deducible(index):
+            return True
+
+        self.grid[index] = num
+        for u, _ in self.cell_units[index]:
+            self.used[u] |= bit
+        return False
 
+    def clear(self, index):
+        '''Removes the clue at index unconditionally, for removals checked by other means.'''
+        bit = 1 << (self.grid[index] - 1)
+        self.grid[index] = 0
+        for u, _ in self.cell_units[index]:
+            self.used[u] &= ~bit
 
+    def is_single(self, index, bit):
+        '''Checks whether the cleared cell is immediately a naked or hidden single.'''
+        if self.geometry.popcount[self.candidates(index)] == 1:
+            return True
+        for u, _ in self.cell_units[index]:
+            if not any(self.grid[i] == 0 and self.candidates(i) & bit for i in self.geometry.units[u] if i != index):
+                return True
+        return False
+
+    def deducible(self, index):
+        '''Runs singles on the reduced puzzle until the cleared cell is filled again.'''
+        if telemetry.active is not None:
+            telemetry.active.count('grader_calls')
+        sudoku = Sudoku(self.geometry)
+        sudoku.grid = list(self.grid)
+        sudoku.initialize_candidates_grid()
+        while sudoku.grid[index] == 0:
+            if not (sudoku.naked_singles() or sudoku.hidden_singles()):
+                return False
+        return True
@@ -0,0 +1,168 @@
+'''Hints for the player: the next logical step from the board as the player sees it.
+
+The player's grid and pencil marks are loaded into the grader's Sudoku and its
+strategy ladder is run until one strategy makes progress. Comparing the grid and
+candidates before and after that strategy gives the placement or the eliminations
+it found. HintService does this on a worker thread so the game loop never waits.'''
+
+import threading
+from cache import LRUCache, zobrist_hash
+from geometry import SYMBOLS, geometry_of
+from grader import Sudoku
+
+
+class Hint:
+    '''One step: the technique that found it, a placement (row, col, num) or
+    eliminations {(row, col): digits}, or the cells holding mistakes.
+    A hint without technique means no step was found.'''
+
+    def __init__(self, technique, placement=None, eliminations=None, mistakes=None):
+        self.technique = technique
+        self.placement = placement
+        self.eliminations = eliminations or {}
+        self.mistakes = mistakes or []
+
+    @property
+    def cells(self):
+        cells = set(self.eliminations) | set(self.mistakes)
+        if self.placement is not None:
+            cells.add(self.placement[:2])
+        return sorted(cells)
+
+    def describe(self):
+        if self.technique is None:
+            return 'No logical step found'
+        if self.mistakes:
+            return 'Check ' + ', '.join('r%dc%d' % (r + 1, c + 1) for r, c in self.mistakes)
+        name = self.technique.replace('_', ' ').capitalize()
+        if self.placement is not None:
+            r, c, num = self.placement
+            return '%s: r%dc%d is %s' % (name, r + 1, c + 1, SYMBOLS[num - 1])
+        removed = ['%s from r%dc%d' % (''.join(SYMBOLS[num - 1] for num in digits), r + 1, c + 1)
+                   for (r, c), digits in sorted(self.eliminations.items())]
+        return '%s: remove %s' % (name, ', '.join(removed))
+
+
+def find_mistakes(grid, pencil_marks, solution, geometry):
+    '''Entries that differ from the solution and pencil marks missing the solution
+    digit, or without a solution entries repeated in a row, column or box.'''
+    n, peers = geometry.size, geometry.peers
+    if solution is None:
+        return [divmod(i, n) for i, num in enumerate(grid)
+                if num and any(grid[peer] == num for peer in peers[i])]
+    return [divmod(i, n) for i, num in enumerate(grid)
+            if (num and num != solution[i]) or
+            (not num and pencil_marks[i] and not pencil_marks[i] >> (solution[i] - 1) & 1)]
+
+
+def next_hint(grid, pencil_marks=None, solution=None, cancelled=None):
+    '''Finds the next step for a grid of any supported size. pencil_marks maps
+    (row, col) to the set of digits the player noted, cells with notes only keep
+    those candidates. Returns a Hint, or None when cancelled() became true on the way.'''
+    geometry = geometry_of(grid)
+    n = geometry.size
+    flat = [num for row in grid for num in row]
+    marks = [0] * (n * n)
+    for (r, c), digits in (pencil_marks or {}).items():
+        for num in digits:
+            marks[r * n + c] |= 1 << (num - 1)
+    flat_solution = None if solution is None else [num for row in solution for num in row]
+
+    mistakes = find_mistakes(flat, marks, flat_solution, geometry)
+    if mistakes:
+        return Hint('mistake', mistakes=mistakes)
+
+    sudoku = Sudoku(geometry)
+    sudoku.grid = flat
+    sudoku.initialize_candidates_grid()
+    for index, mask in enumerate(marks):
+        if mask and not flat[index]:
+            sudoku.eliminate(index, geometry.all_digits & ~mask)
+
+    for _, strategy in sudoku.hard_strategies:
+        if cancelled is not None and cancelled():
+            return None
+        grid_before, candidates_before = list(sudoku.grid), list(sudoku.candidates)
+        if not strategy():
+            continue
+
+        name = strategy.__name__
+        for index, num in enumerate(sudoku.grid):
+            if num != grid_before[index]:
+                return Hint(name, placement=divmod(index, n) + (num,))
+        eliminations = {divmod(index, n): geometry.digits[before & ~after]
+                        for index, (before, after) in enumerate(zip(candidates_before, sudoku.candidates))
+                        if before & ~after}
+        return Hint(name, eliminations=eliminations)
+    return Hint(None)
+
+
+class HintService:
+    '''Computes hints on a background thread. request() replaces any earlier
+    request, a request superseded or cancelled while running is dropped.
+    Results are cached by board state; result() is polled from the game loop.'''
+
+    def __init__(self, cache_size=256):
+        self.cache = LRUCache(maxsize=cache_size)
+        self.lock = threading.Lock()
+        self.wake = threading.Condition(self.lock)
+        self.generation = 0
+        self.request_args = None
+        self.ready = None
+        self.closed = False
+        self.thread = threading.Thread(target=self.work, daemon=True)
+        self.thread.start()
+
+    @property
+    def pending(self):
+        return self.request_args is not None
+
+    def request(self, grid, pencil_marks=None, solution=None):
+        grid = [row.copy() for row in grid]
+        pencil_marks = {cell: set(digits) for cell, digits in (pencil_marks or {}).items() if digits}
+        solution = None if solution is None else [row.copy() for row in solution]
+        key = (zobrist_hash(grid), frozenset((cell, frozenset(digits)) for cell, digits in pencil_marks.items()),
+               solution is not None)
+        with self.lock:
+            self.generation += 1
+            hint = self.cache.get(key)
+            if hint is not None:
+                self.ready, self.request_args = hint, None
+            else:
+                self.ready = None
+                self.request_args = (self.generation, key, grid, pencil_marks, solution)
+                self.wake.notify()
+
+    def cancel(self):
+        '''Drops the current request, called whenever the board changes.'''
+        with self.lock:
+            self.generation += 1
+            self.request_args = self.ready = None
+
+    def result(self):
+        '''Returns the finished hint once, None while there is none.'''
+        with self.lock:
+            hint, self.ready = self.ready, None
+        return hint
+
+    def work(self):
+        while True:
+            with self.wake:
+                while self.request_args is None and not self.closed:
+                    self.wake.wait()
+                if self.closed:
+                    return
+                generation, key, grid, pencil_marks, solution = self.request_args
+
+            hint = next_hint(grid, pencil_marks, solution, cancelled=lambda: self.generation != generation)
+            with self.lock:
+                if hint is not None:
+                    self.cache.put(key, hint)
+                if generation == self.generation:
+                    self.ready, self.request_args = hint, None
+
+    def close(self):
+        with self.wake:
+            self.closed = True
+            self.wake.notify()
+        self.thread.join()
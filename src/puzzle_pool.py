@@ -0,0 +1,85 @@
+import multiprocessing
+import random
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from generator import generate_seeded
+from transform import equivalents
+
+
+class PuzzlePool:
+    '''Keeps ready-made puzzles for every difficulty, generated on a process pool
+    in the background. Once the ready + pending puzzles of a difficulty drop to
+    the low watermark the pool is topped back up to the high watermark.
+    With variants > 1 every generated puzzle is expanded into that many
+    equivalent puzzles by symmetry transformations (9x9 boards only).
+    An exception raised while generating is re-raised by the next pop().'''
+
+    def __init__(self, difficulties=('Easy', 'Medium', 'Hard'), low=1, high=3, workers=1, seed=None, variants=1,
+                 size=9):
+        if variants > 1 and size != 9:
+            raise ValueError('symmetry variants are only available for 9x9 boards')
+        self.size = size
+        self.low = low
+        self.high = high
+        self.variants = variants
+        self.ready = {difficulty: deque() for difficulty in difficulties}
+        self.pending = {difficulty: 0 for difficulty in difficulties}
+        self.futures = set()
+        self.error = None
+        self.lock = threading.Lock()
+        self.seeds = random.Random(seed)
+        # spawned, not forked: a pool created while another pool's threads run could deadlock its workers
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        for difficulty in difficulties:
+            self.refill(difficulty)
+
+    def refill(self, difficulty):
+        with self.lock:
+            available = len(self.ready[difficulty]) + self.pending[difficulty] * self.variants
+            if available > self.low:
+                return
+            jobs = -(-(self.high - available) // self.variants)
+            seeds = [self.seeds.getrandbits(64) for _ in range(jobs)]
+            self.pending[difficulty] += len(seeds)
+
+        for seed in seeds:
+            future = self.executor.submit(generate_seeded, difficulty, seed, self.size)
+            with self.lock:
+                self.futures.add(future)
+            future.add_done_callback(partial(self.finished, difficulty, seed))
+
+    def finished(self, difficulty, seed, future):
+        puzzles, error = [], None
+        if not future.cancelled():
+            try:
+                grid, solution = future.result()
+                puzzles = [(grid, solution)]
+                if self.variants > 1:
+                    puzzles = list(equivalents(grid, solution, seed=seed, count=self.variants))
+            except Exception as exception:
+                error = exception
+        with self.lock:
+            self.pending[difficulty] -= 1
+            self.futures.discard(future)
+            self.ready[difficulty].extend(puzzles)
+            if error is not None and self.error is None:
+                self.error = error
+
+    def pop(self, difficulty):
+        '''Returns a ready (grid, solution) pair or None when the pool
+        of the difficulty is still being filled, never blocks. Raises the
+        error of a failed generation job instead of waiting forever.'''
+        with self.lock:
+            error, self.error = self.error, None
+            if error is not None:
+                raise error
+            puzzle = self.ready[difficulty].popleft() if self.ready[difficulty] else None
+        self.refill(difficulty)
+        return puzzle
+
+    def close(self):
+        for future in list(self.futures):
+            future.cancel()
+        self.executor.shutdown(wait=False)
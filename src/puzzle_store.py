@@ -0,0 +1,127 @@
+'''Binary puzzle store: a small file header followed by fixed-width records,
+so puzzle #N is read straight out of a memory map at a computed offset.
+
+Record layout (94 bytes): difficulty code, flags, rating, seed,
+then puzzle and solution packed as 81 nibbles each.'''
+
+import mmap
+import os
+import struct
+from collections import namedtuple
+import dlx
+from bitboard import BitBoard
+from utility import grid_from_line
+
+MAGIC = b'SDKS'
+VERSION = 1
+FILE_HEADER = struct.Struct('<4sHH')
+RECORD_HEADER = struct.Struct('<BBHQ')
+GRID_BYTES = 41
+RECORD_SIZE = RECORD_HEADER.size + 2 * GRID_BYTES
+DIFFICULTIES = (None, 'Easy', 'Medium', 'Hard')
+
+StoredPuzzle = namedtuple('StoredPuzzle', ['grid', 'solution', 'difficulty', 'rating', 'seed'])
+
+
+def pack_grid(grid):
+    values = [num for row in grid for num in row] + [0]
+    return bytes((values[i] << 4) | values[i + 1] for i in range(0, 82, 2))
+
+def unpack_grid(data):
+    values = []
+    for byte in data:
+        values.append(byte >> 4)
+        values.append(byte & 0xF)
+    return [values[row * 9:row * 9 + 9] for row in range(9)]
+
+
+class PuzzleStoreWriter:
+    '''Appends puzzles to a store file, creating it with a header if needed.'''
+
+    def __init__(self, path, append=False):
+        append = append and os.path.exists(path)
+        self.file = open(path, 'r+b' if append else 'wb')
+        if append:
+            header = self.file.read(FILE_HEADER.size)
+            if FILE_HEADER.unpack(header) != (MAGIC, VERSION, RECORD_SIZE):
+                raise ValueError('%s is not a version %d puzzle store' % (path, VERSION))
+            self.file.seek(0, 2)
+        else:
+            self.file.write(FILE_HEADER.pack(MAGIC, VERSION, RECORD_SIZE))
+
+    def add(self, grid, solution, difficulty=None, rating=0, seed=0):
+        if len(grid) != 9 or len(solution) != 9:
+            raise ValueError('the puzzle store holds 9x9 puzzles only')
+        header = RECORD_HEADER.pack(DIFFICULTIES.index(difficulty), 0, rating, seed)
+        self.file.write(header + pack_grid(grid) + pack_grid(solution))
+
+    def import_lines(self, lines, difficulty=None):
+        '''Bulk-imports puzzles in the 81 character line format, solving each one.
+        Lines that are blank, comments, do not parse, are larger than 9x9 or
+        puzzles without a unique solution are skipped. Returns the number of imported puzzles.'''
+        imported = 0
+        for line in lines:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            try:
+                grid = grid_from_line(line.split()[0])
+            except ValueError:
+                continue
+            if len(grid) != 9 or dlx.count_solutions(grid, 2) != 1:
+                continue
+            board = BitBoard(grid)
+            board.solve()
+            self.add(grid, board.to_grid(), difficulty)
+            imported += 1
+        return imported
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PuzzleStoreReader:
+    '''Random access to a store file through a read-only memory map.'''
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if FILE_HEADER.unpack_from(self.data) != (MAGIC, VERSION, RECORD_SIZE):
+            self.close()
+            raise ValueError('%s is not a version %d puzzle store' % (path, VERSION))
+        self.count = (len(self.data) - FILE_HEADER.size) // RECORD_SIZE
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError('puzzle index out of range')
+        offset = FILE_HEADER.size + index * RECORD_SIZE
+        difficulty, _, rating, seed = RECORD_HEADER.unpack_from(self.data, offset)
+        offset += RECORD_HEADER.size
+        grid = unpack_grid(self.data[offset:offset + GRID_BYTES])
+        solution = unpack_grid(self.data[offset + GRID_BYTES:offset + 2 * GRID_BYTES])
+        return StoredPuzzle(grid, solution, DIFFICULTIES[difficulty], rating, seed)
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,216 @@
+'''Small HTTP/JSON puzzle service built on asyncio, without a display or pygame.
+
+Every difficulty has a queue that background tasks keep full with puzzles
+generated on a process pool, so a request only waits when its queue ran dry.
+Grading and solving run on a separate process pool, so they never queue behind
+generation and the event loop stays responsive.
+
+    GET  /puzzle?difficulty=Hard   {"difficulty", "graded", "seed", "puzzle", "solution"}
+    POST /grade  {"puzzle": line}  the grade report
+    POST /solve  {"puzzle": line}  {"solution": line, "unique": bool or null}
+    GET  /stats                    queue sizes and served puzzles
+
+    python server.py --port 8080 --queue-size 16'''
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from cli import find_solution
+from generator import generate_graded
+from grader import grade
+from utility import grid_from_line, grid_to_line
+
+DIFFICULTIES = ('Easy', 'Medium', 'Hard')
+FILL_RETRY_DELAY = 1.0
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 422: 'Unprocessable Entity',
+           500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def grade_line(line):
+    return grade(grid_from_line(line)).as_dict()
+
+
+def solve_line(line):
+    '''The solution and whether it is unique, None as unique when the search
+    budget ran out before that was known. Without a solution only the number
+    of solutions is returned, 0 or None when the search gave up.'''
+    solutions, solution = find_solution(grid_from_line(line))
+    if solution is None:
+        return {'solutions': solutions}
+    return {'solution': grid_to_line(solution), 'unique': None if solutions is None else solutions == 1}
+
+
+class PuzzleServer:
+    '''Serves puzzles from per difficulty queues of queue_size puzzles. Each
+    difficulty has one filler task per worker process, a filler waits while
+    its queue is full.'''
+
+    def __init__(self, queue_size=8, workers=None, seed=None, difficulties=DIFFICULTIES, request_workers=1):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        # spawned, not forked: the generation pool's threads may already be running when they start
+        self.request_executor = ProcessPoolExecutor(max_workers=request_workers,
+                                                    mp_context=multiprocessing.get_context('spawn'))
+        self.queues = {difficulty: asyncio.Queue(maxsize=queue_size) for difficulty in difficulties}
+        self.seeds = random.Random(seed)
+        self.served = {difficulty: 0 for difficulty in difficulties}
+        self.waits = {difficulty: 0.0 for difficulty in difficulties}
+        self.tasks = []
+        self.server = None
+
+    async def start(self, host, port):
+        # start the request workers now instead of on the first request
+        await asyncio.get_event_loop().run_in_executor(self.request_executor, int)
+        self.tasks = [asyncio.ensure_future(self.fill(difficulty))
+                      for difficulty in self.queues for _ in range(self.workers)]
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    async def fill(self, difficulty):
+        loop = asyncio.get_event_loop()
+        queue = self.queues[difficulty]
+        while True:
+            seed = self.seeds.getrandbits(64)
+            try:
+                grid, solution, report = await loop.run_in_executor(self.executor, generate_graded, difficulty, seed)
+            except Exception as error:
+                # a failed seed must not stop the filler, or its queue would drain for good
+                print('generating %s puzzle with seed %d failed: %r' % (difficulty, seed, error), file=sys.stderr)
+                await asyncio.sleep(FILL_RETRY_DELAY)
+                continue
+            await queue.put({'difficulty': difficulty, 'graded': report.difficulty, 'seed': seed,
+                             'puzzle': grid_to_line(grid), 'solution': grid_to_line(solution)})
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown(wait=False)
+        self.request_executor.shutdown(wait=False)
+
+    async def handle(self, reader, writer):
+        '''Serves requests on one connection, keeping it open between requests
+        unless the client asks to close it.'''
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode('latin-1').strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                body = await reader.readexactly(length) if length else b''
+
+                try:
+                    status, payload = 200, await self.route(method, target, body)
+                except HTTPError as error:
+                    status, payload = error.status, {'error': str(error)}
+                except Exception as error:
+                    status, payload = 500, {'error': repr(error)}
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                data = json.dumps(payload).encode()
+                writer.write(('HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n'
+                              'Connection: %s\r\n\r\n' % (status, REASONS[status], len(data),
+                                                          'keep-alive' if keep_alive else 'close')).encode())
+                writer.write(data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, target, body):
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        loop = asyncio.get_event_loop()
+
+        if url.path == '/puzzle':
+            if method != 'GET':
+                raise HTTPError(405, 'use GET')
+            difficulty = query.get('difficulty', ['Medium'])[0]
+            if difficulty not in self.queues:
+                raise HTTPError(400, 'unknown difficulty %r' % difficulty)
+            start = time.perf_counter()
+            puzzle = await self.queues[difficulty].get()
+            self.served[difficulty] += 1
+            self.waits[difficulty] += time.perf_counter() - start
+            return puzzle
+
+        if url.path in ('/grade', '/solve'):
+            if method != 'POST':
+                raise HTTPError(405, 'use POST')
+            try:
+                line = json.loads(body)['puzzle']
+                grid_from_line(line)
+            except (ValueError, KeyError, TypeError) as error:
+                raise HTTPError(400, 'expected {"puzzle": <puzzle line>}: %s' % error)
+            if url.path == '/grade':
+                return await loop.run_in_executor(self.request_executor, grade_line, line)
+            result = await loop.run_in_executor(self.request_executor, solve_line, line)
+            if 'solution' not in result:
+                if result['solutions'] == 0:
+                    raise HTTPError(400, 'puzzle has no solution')
+                raise HTTPError(422, 'no solution found within the search budget')
+            return result
+
+        if url.path == '/stats':
+            return {difficulty: {'queued': queue.qsize(), 'served': self.served[difficulty],
+                                 'mean_wait': self.waits[difficulty] / self.served[difficulty]
+                                 if self.served[difficulty] else 0.0}
+                    for difficulty, queue in self.queues.items()}
+
+        raise HTTPError(404, 'no route for %s' % url.path)
+
+
+async def serve(args):
+    server = PuzzleServer(queue_size=args.queue_size, workers=args.workers, seed=args.seed,
+                          request_workers=args.request_workers)
+    listener = await server.start(args.host, args.port)
+    print('serving on http://%s:%d' % (args.host, args.port))
+    try:
+        await listener.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--queue-size', type=int, default=8, help='ready puzzles kept per difficulty')
+    parser.add_argument('--workers', type=int, help='generator processes, all cores by default')
+    parser.add_argument('--request-workers', type=int, default=1, help='processes for /grade and /solve')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+'''Optional per-generation instrumentation.
+
+Hot paths only test `telemetry.active is not None`, so nothing is recorded
+and nearly nothing is paid while no collection is running:
+
+    with telemetry.collect() as stats:
+        generate_puzzle('Medium')
+    stats.as_record()'''
+
+import time
+from contextlib import contextmanager
+
+active = None
+
+
+class GenerationStats:
+    def __init__(self):
+        self.counters = {}
+        self.strategies = {}
+        self.started = time.perf_counter()
+        self.duration = None
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def strategy(self, name, hit, seconds):
+        calls, hits, total = self.strategies.get(name, (0, 0, 0.0))
+        self.strategies[name] = (calls + 1, hits + bool(hit), total + seconds)
+
+    def as_record(self):
+        return {'duration': self.duration,
+                'counters': dict(self.counters),
+                'strategies': {name: {'calls': calls, 'hits': hits, 'seconds': seconds}
+                               for name, (calls, hits, seconds) in self.strategies.items()}}
+
+
+@contextmanager
+def collect():
+    '''Records everything the generator and grader do inside the block.'''
+    global active
+    previous, active = active, GenerationStats()
+    stats = active
+    try:
+        yield stats
+    finally:
+        stats.duration = time.perf_counter() - stats.started
+        active = previous
+
+
+def histogram(values, bins=10):
+    '''Buckets values into equal-width bins, returns (lower, upper, count) tuples.'''
+    values = list(values)
+    if not values:
+        return []
+    low, high = min(values), max(values)
+    width = (high - low) / bins or 1
+    counts = [0] * bins
+    for value in values:
+        counts[min(bins - 1, int((value - low) / width))] += 1
+    return [(low + i * width, low + (i + 1) * width, count) for i, count in enumerate(counts)]
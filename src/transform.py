@@ -0,0 +1,67 @@
+'''Validity preserving Sudoku transformations.
+
+Relabelling digits, permuting rows within a band, columns within a stack,
+permuting bands and stacks and transposing map a puzzle with a unique solution
+to another one solved with exactly the same techniques. Together they give
+2 * 1296 * 1296 * 9! (about 1.2 trillion) transformations, addressed here by an
+index so they can be enumerated lazily without repeats.'''
+
+import math
+import random
+from itertools import permutations
+
+PERMS3 = list(permutations(range(3)))
+ARRANGEMENTS = 6 ** 4
+DIGIT_PERMUTATIONS = math.factorial(9)
+TOTAL = 2 * ARRANGEMENTS * ARRANGEMENTS * DIGIT_PERMUTATIONS
+
+
+def arrangement(index):
+    '''Row (or column) order for index in range(1296): a band order
+    followed by the order of rows inside each of the three bands.'''
+    index, bands = divmod(index, 6)
+    order = []
+    for band in PERMS3[bands]:
+        index, inner = divmod(index, 6)
+        order.extend(3 * band + row for row in PERMS3[inner])
+    return order
+
+
+def digit_permutation(index):
+    '''Decodes index in range(9!) as a relabelling list, 0 (empty) maps to itself.'''
+    digits = list(range(1, 10))
+    mapping = [0]
+    for place in range(8, -1, -1):
+        position, index = divmod(index, math.factorial(place))
+        mapping.append(digits.pop(position))
+    return mapping
+
+
+def decode(index):
+    index, transpose = divmod(index, 2)
+    index, rows = divmod(index, ARRANGEMENTS)
+    digits, cols = divmod(index, ARRANGEMENTS)
+    return bool(transpose), arrangement(rows), arrangement(cols), digit_permutation(digits)
+
+
+def apply(grid, transformation):
+    transpose, rows, cols, digits = transformation
+    if transpose:
+        grid = [list(column) for column in zip(*grid)]
+    return [[digits[grid[row][col]] for col in cols] for row in rows]
+
+
+def equivalents(grid, solution, seed=None, count=None):
+    '''Lazily yields up to count (all TOTAL by default) distinct transformations
+    of a puzzle and its solution. Indices are visited by a seeded affine
+    permutation of range(TOTAL), so the same seed gives the same sequence.
+    A puzzle with symmetries of its own can map to the same grid twice.'''
+    rng = random.Random(seed)
+    step = rng.randrange(1, TOTAL)
+    while math.gcd(step, TOTAL) != 1:
+        step = rng.randrange(1, TOTAL)
+    offset = rng.randrange(TOTAL)
+
+    for k in range(TOTAL if count is None else min(count, TOTAL)):
+        transformation = decode((offset + k * step) % TOTAL)
+        yield apply(grid, transformation), apply(solution, transformation)
@@ -1,43 +1,89 @@
 import pygame
 import sys
-from generator import generate_puzzle
-from utility import get_filled
+from puzzle_pool import PuzzlePool
+from hints import HintService
+from board_model import BoardModel
+from geometry import geometry
 
 
 class SudokuGame:
     def __init__(self):
         pygame.init()
 
-        self.WIDTH, self.HEIGHT = 540, 540
-        self.CELL_SIZE = 60
+        self.CELL_SIZES = {9: 60, 16: 48, 25: 36}
+        self.BOARD_SIZES = {'9x9': 9, '16x16': 16, '25x25': 25}
         self.BG_COLOR = (255, 255, 255)
         self.LINE_COLOR = (0, 0, 0)
         self.SELECT_COLOR = (250, 220, 100)
-        self.FONT = pygame.font.SysFont(None, 40)
-        self.CANDIDATE_FONT = pygame.font.SysFont(None, 15)
+        self.GIVEN_COLOR = (0, 0, 0)
+        self.ENTRY_COLOR = (0, 0, 200)
+        self.CONFLICT_COLOR = (220, 0, 0)
+        self.CANDIDATE_COLOR = (0, 0, 0)
+        self.HINT_COLOR = (190, 230, 190)
+        self.HINT_DIGIT_COLOR = (0, 140, 0)
+        self.ELIMINATED_COLOR = (200, 0, 0)
+        self.LOADING_POLL_MS = 50
+        self.KEYPAD_DIGITS = {getattr(pygame, 'K_KP%d' % num): num for num in range(1, 10)}
 
-        self.screen = pygame.display.set_mode((self.WIDTH, self.HEIGHT))
         pygame.display.set_caption('Sudoku')
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed([pygame.QUIT, pygame.MOUSEBUTTONDOWN, pygame.KEYDOWN, pygame.TEXTINPUT,
+                                  pygame.VIDEOEXPOSE])
         self.clock = pygame.time.Clock()
+
+        self.board_size = None
+        self.layout(9)
+        self.dirty = set()
         self.state = 'menu'
         self.difficulty = None
-        self.menu_buttons = {'Easy': pygame.Rect(70, 200, 180, 50), 'Medium': pygame.Rect(290, 200, 180, 50),
-                              'Start': pygame.Rect(70, 300, 400, 50) }
+        self.size = 9
+        self.menu_buttons = {'9x9': pygame.Rect(70, 130, 120, 50), '16x16': pygame.Rect(210, 130, 120, 50),
+                             '25x25': pygame.Rect(350, 130, 120, 50),
+                             'Easy': pygame.Rect(70, 200, 120, 50), 'Medium': pygame.Rect(210, 200, 120, 50),
+                             'Hard': pygame.Rect(350, 200, 120, 50), 'Start': pygame.Rect(70, 300, 400, 50) }
 
-        self.grid = None
-        self.solution = None
+        self.board = None
         self.solved = None
         self.selected_cell = None
         self.selected_type = None
-        self.locked = None
-        self.candidates = None
+        self.hint = None
+        self.pools = {9: PuzzlePool(('Easy', 'Medium', 'Hard'))}
+        self.hints = HintService()
+
+    def layout(self, size):
+        '''Sizes the window for a size x size board and renders the fonts, glyphs
+        and grid for it. The menu uses the 9x9 layout.'''
+        if size == self.board_size:
+            return
+        self.board_size = size
+        self.box = geometry(size).box
+        self.CELL_SIZE = self.CELL_SIZES[size]
+        self.WIDTH = self.HEIGHT = size * self.CELL_SIZE
+        self.FONT = pygame.font.SysFont(None, 40 * self.CELL_SIZE // 60)
+        self.CANDIDATE_FONT = pygame.font.SysFont(None, max(15 * (self.CELL_SIZE // self.box) // 20, 10))
+        self.screen = pygame.display.set_mode((self.WIDTH, self.HEIGHT))
+
+        symbols = geometry(size).symbols
+        self.digit_glyphs = {color: self.render_glyphs(self.FONT, color, symbols)
+                             for color in (self.GIVEN_COLOR, self.ENTRY_COLOR, self.CONFLICT_COLOR, self.HINT_DIGIT_COLOR)}
+        self.candidate_glyphs = self.render_glyphs(self.CANDIDATE_FONT, self.CANDIDATE_COLOR, symbols)
+        self.eliminated_glyphs = self.render_glyphs(self.CANDIDATE_FONT, self.ELIMINATED_COLOR, symbols)
+        self.background, self.grid_lines = self.render_grid()
+        self.full_redraw = True
+
+    def pool(self, size):
+        '''The puzzle pool of a board size, started the first time the size is chosen.'''
+        if size not in self.pools:
+            self.pools[size] = PuzzlePool(('Easy', 'Medium', 'Hard'), size=size)
+        return self.pools[size]
 
     def draw_menu(self):
         self.screen.fill(self.BG_COLOR)
         title = self.FONT.render('Select Difficulty', True, self.LINE_COLOR)
         self.screen.blit(title, (self.WIDTH // 2 - title.get_width() // 2, 100))
         for text, rect in self.menu_buttons.items():
-            color = self.SELECT_COLOR if text == self.difficulty else (200, 200, 200)
+            selected = text == self.difficulty or self.BOARD_SIZES.get(text) == self.size
+            color = self.SELECT_COLOR if selected else (200, 200, 200)
             pygame.draw.rect(self.screen, color, rect)
             label = self.FONT.render(text, True, self.LINE_COLOR)
             self.screen.blit(label, (
@@ -45,73 +91,172 @@ class SudokuGame:
                 rect.y + rect.height // 2 - label.get_height() // 2
             ))
 
-    def draw_grid(self):
+    def draw_loading(self):
         self.screen.fill(self.BG_COLOR)
-        for i in range(9 + 1):
-            thickness = 4 if i % 3 == 0 else 1
-            pygame.draw.line(self.screen, self.LINE_COLOR, (0, i * self.CELL_SIZE), (self.WIDTH, i * self.CELL_SIZE),
+        text = self.FONT.render('Generating...', True, self.LINE_COLOR)
+        self.screen.blit(text, (self.WIDTH // 2 - text.get_width() // 2, self.HEIGHT // 2 - text.get_height() // 2))
+
+    def render_glyphs(self, font, color, symbols):
+        '''Surfaces for the digit symbols in one color, indexed by digit.'''
+        return [None] + [font.render(symbol, True, color) for symbol in symbols]
+
+    def render_grid(self):
+        '''The static board: a background with the grid drawn on it and the grid
+        lines alone on a transparent surface, drawn again over highlighted cells.'''
+        background = pygame.Surface((self.WIDTH, self.HEIGHT))
+        background.fill(self.BG_COLOR)
+        lines = pygame.Surface((self.WIDTH, self.HEIGHT), pygame.SRCALPHA)
+        for i in range(self.board_size + 1):
+            thickness = 4 if i % self.box == 0 else 1
+            pygame.draw.line(lines, self.LINE_COLOR, (0, i * self.CELL_SIZE), (self.WIDTH, i * self.CELL_SIZE),
                              thickness)
-            pygame.draw.line(self.screen, self.LINE_COLOR, (i * self.CELL_SIZE, 0), (i * self.CELL_SIZE, self.HEIGHT),
+            pygame.draw.line(lines, self.LINE_COLOR, (i * self.CELL_SIZE, 0), (i * self.CELL_SIZE, self.HEIGHT),
                              thickness)
+        background.blit(lines, (0, 0))
+        return background, lines
 
-    def draw_numbers(self):
-        for r in range(9):
-            for c in range(9):
-                num = self.grid[r][c]
-                if num != 0:
-                    color = (0, 0, 0) if (r, c) in self.locked else (0, 0, 200)
-                    text = self.FONT.render(str(num), True, color)
-                    self.screen.blit(text, (c * self.CELL_SIZE + 24, r * self.CELL_SIZE + 20))
-
-    def draw_candidates(self):
-        for r in range(9):
-            for c in range(9):
-                num = self.grid[r][c]
-                if num == 0:
-                    color = (0, 0, 0)
-                    for candidate in self.candidates[(r, c)]:
-                        text = self.CANDIDATE_FONT.render(str(candidate), True, color)
-                        self.screen.blit(text, (c * self.CELL_SIZE + 10 + ((candidate - 1) % 3) * 20,
-                                                r * self.CELL_SIZE + 10 + ((candidate - 1) // 3) * 20))
-
-    def draw_selected_cell(self):
-        if self.selected_cell:
-            r, c = self.selected_cell
-            pygame.draw.rect(self.screen, self.SELECT_COLOR,
-                             (c * self.CELL_SIZE, r * self.CELL_SIZE, self.CELL_SIZE, self.CELL_SIZE))
+    def mark_dirty(self, cell):
+        if cell is not None:
+            self.dirty.add(cell)
+
+    def draw_cell(self, r, c):
+        '''Redraws one cell from the cached background and glyphs, returns its rect.'''
+        rect = pygame.Rect(c * self.CELL_SIZE, r * self.CELL_SIZE, self.CELL_SIZE, self.CELL_SIZE)
+        hinted = self.hint is not None and (r, c) in self.hint.cells
+        if (r, c) == self.selected_cell or hinted:
+            self.screen.fill(self.SELECT_COLOR if (r, c) == self.selected_cell else self.HINT_COLOR, rect)
+            self.screen.blit(self.grid_lines, rect, rect)
+        else:
+            self.screen.blit(self.background, rect, rect)
+
+        num = self.board.value(r, c)
+        if num == 0 and hinted and self.hint.placement is not None and self.hint.placement[:2] == (r, c):
+            glyph = self.digit_glyphs[self.HINT_DIGIT_COLOR][self.hint.placement[2]]
+            self.screen.blit(glyph, glyph.get_rect(center=rect.center))
+        elif num != 0:
+            if (r, c) in self.board.locked:
+                color = self.GIVEN_COLOR
+            else:
+                color = self.CONFLICT_COLOR if self.board.is_conflict(r, c) else self.ENTRY_COLOR
+            glyph = self.digit_glyphs[color][num]
+            self.screen.blit(glyph, glyph.get_rect(center=rect.center))
+        else:
+            # pencil marks sit in a box x box grid inside the cell
+            eliminated = self.hint.eliminations.get((r, c), ()) if hinted else ()
+            step = self.CELL_SIZE // self.box
+            margin = (self.CELL_SIZE - step * self.box) // 2 + step // 2
+            for candidate in set(self.board.pencil_marks(r, c)) | set(eliminated):
+                glyphs = self.eliminated_glyphs if candidate in eliminated else self.candidate_glyphs
+                row, col = divmod(candidate - 1, self.box)
+                center = (rect.x + margin + col * step, rect.y + margin + row * step)
+                self.screen.blit(glyphs[candidate], glyphs[candidate].get_rect(center=center))
+        return rect
+
+    def set_hint(self, hint):
+        '''Shows a hint: its cells are highlighted and the step is described in
+        the window title. None clears the current hint.'''
+        for cell in self.hint.cells if self.hint is not None else ():
+            self.dirty.add(cell)
+        self.hint = hint
+        for cell in hint.cells if hint is not None else ():
+            self.dirty.add(cell)
+        pygame.display.set_caption('Sudoku' if hint is None else 'Sudoku - ' + hint.describe())
+
+    def board_changed(self, cells):
+        '''Redraws the cells a move changed, drops any hint for the old board
+        and updates the win state.'''
+        if not cells:
+            return
+        self.dirty.update(cells)
+        self.hints.cancel()
+        if self.hint is not None:
+            self.set_hint(None)
+        if self.board.solved != self.solved:
+            self.solved = self.board.solved
+            self.full_redraw = True
 
     def draw_winscreen(self):
+        rect = pygame.Rect(0, 0, 150, 60)
+        rect.center = (self.WIDTH // 2, self.HEIGHT // 2)
         color = (200, 200, 200)
-        pygame.draw.rect(self.screen, color, (200, 200, 150, 60))
+        pygame.draw.rect(self.screen, color, rect)
         win_text = self.FONT.render('SOLVED', True, self.LINE_COLOR)
-        self.screen.blit(win_text, (220,
-                                    220))
+        self.screen.blit(win_text, win_text.get_rect(center=rect.center))
+        return rect
 
     def playing_display(self):
-        self.draw_grid()
-        self.draw_selected_cell()
-        self.draw_numbers()
-        self.draw_candidates()
-        if self.solved:
-            self.draw_winscreen()
+        '''Draws only the cells that changed since the last frame, or the whole
+        board after a state change, and updates just those regions of the display.'''
+        if self.full_redraw:
+            cells = [(r, c) for r in range(self.board_size) for c in range(self.board_size)]
+        else:
+            cells = self.dirty
+        rects = [self.draw_cell(r, c) for r, c in cells]
+        if self.solved and rects:
+            rects.append(self.draw_winscreen())
+        self.dirty.clear()
+
+        if self.full_redraw:
+            pygame.display.flip()
+        elif rects:
+            pygame.display.update(rects)
+
+    def render(self):
+        if self.state == 'playing':
+            self.playing_display()
+        elif self.full_redraw:
+            if self.state == 'menu':
+                self.draw_menu()
+            else:
+                self.draw_loading()
+            pygame.display.flip()
+        self.full_redraw = False
+
+    def wait_events(self):
+        '''Blocks until there is input. While loading or computing a hint, wakes up
+        regularly to check for the result.'''
+        if self.state == 'loading' or self.hints.pending:
+            first = pygame.event.wait(self.LOADING_POLL_MS)
+        else:
+            first = pygame.event.wait()
+        return [first] + pygame.event.get()
 
     def mouse_click_menu(self, pos):
+        self.full_redraw = True
         for text, rect in self.menu_buttons.items():
             if rect.collidepoint(pos):
                 if text in ('Easy', 'Medium', 'Hard'):
                     self.difficulty = text
+                elif text in self.BOARD_SIZES:
+                    self.size = self.BOARD_SIZES[text]
+                    self.pool(self.size)
                 elif text == 'Start':
                     if self.difficulty:
-                        self.grid, self.solution = generate_puzzle(self.difficulty)
-                        self.locked = get_filled(self.grid)
-                        self.state = 'playing'
-                        self.solved = False
-                        self.candidates = {(r, c): set() for r in range(9) for c in range(9)}
+                        self.state = 'loading'
+                        self.start_game()
+
+    def start_game(self):
+        '''Takes a ready puzzle from the pool, stays in the loading state
+        until one is available.'''
+        puzzle = self.pool(self.size).pop(self.difficulty)
+        if puzzle is None:
+            return
+        self.board = BoardModel(*puzzle)
+        self.selected_cell = None
+        self.layout(self.size)
+        self.hints.cancel()
+        self.hint = None
+        pygame.display.set_caption('Sudoku')
+        self.state = 'playing'
+        self.full_redraw = True
+        self.solved = False
 
     def mouse_click_playing(self, key, pos):
         x, y = pos
         r, c = y // self.CELL_SIZE, x // self.CELL_SIZE
-        if (r, c) not in self.locked:
+        if (r, c) not in self.board.locked and key in (1, 3):
+            self.mark_dirty(self.selected_cell)
+            self.mark_dirty((r, c))
             if key == 1:
                 self.selected_cell = (r, c)
                 self.selected_type = 1
@@ -122,46 +267,67 @@ class SudokuGame:
     def handle_key_press(self, key, unicode):
         if key == pygame.K_ESCAPE:
             self.state = 'menu'
+            self.layout(9)
+            self.full_redraw = True
+            return
+        if self.state != 'playing':
+            return
+
+        # on 16x16 and 25x25 boards letters are digits too, F1 and F2 always work
+        num = self.board.geometry.value(unicode) if unicode else self.KEYPAD_DIGITS.get(key)
+        if pygame.key.get_mods() & pygame.KMOD_CTRL:
+            if key == pygame.K_z:
+                self.board_changed(self.board.undo())
+            elif key == pygame.K_y:
+                self.board_changed(self.board.redo())
+
+        elif key == pygame.K_F1 or (key == pygame.K_h and not num):
+            if not self.solved:
+                self.hints.request(self.board.grid, self.board.all_pencil_marks(), self.board.solution)
+
+        elif key == pygame.K_F2 or (key == pygame.K_a and not num):
+            self.board_changed(self.board.set_auto_marks(not self.board.auto_marks))
 
         elif self.selected_cell:
             r, c = self.selected_cell
             if key in [pygame.K_BACKSPACE, pygame.K_DELETE]:
-                self.grid[r][c] = 0
+                self.board_changed(self.board.set_value(r, c, 0))
 
-            elif unicode in '123456789':
-                num = int(unicode)
+            elif num:
                 if self.selected_type == 1:
-                    self.grid[r][c] = num
-                    if self.grid == self.solution:
-                        self.solved = True
+                    self.board_changed(self.board.set_value(r, c, num))
                 else:
-                    if num in self.candidates[(r, c)]:
-                        self.candidates[(r, c)].remove(num)
-                    else:
-                        self.candidates[(r, c)].add(num)
+                    self.board_changed(self.board.toggle_mark(r, c, num))
 
     def run(self):
         running = True
         while running:
+            self.render()
             self.clock.tick(60)
-            for event in pygame.event.get():
+            for event in self.wait_events():
                 if event.type == pygame.QUIT:
                     running = False
 
+                elif event.type == pygame.VIDEOEXPOSE:
+                    self.full_redraw = True
+
                 elif event.type == pygame.MOUSEBUTTONDOWN:
                     if self.state == 'menu':
                         self.mouse_click_menu(pygame.mouse.get_pos())
-                    else:
+                    elif self.state == 'playing':
                         self.mouse_click_playing(event.button, pygame.mouse.get_pos())
                 elif event.type == pygame.KEYDOWN:
                     self.handle_key_press(event.key, event.unicode)
 
-            if self.state == 'menu':
-                self.draw_menu()
-
-            else:
-                self.playing_display()
-            pygame.display.flip()
+            if self.state == 'loading':
+                self.start_game()
+            elif self.state == 'playing':
+                hint = self.hints.result()
+                if hint is not None:
+                    self.set_hint(hint)
 
+        for pool in self.pools.values():
+            pool.close()
+        self.hints.close()
         pygame.quit()
         sys.exit()
@@ -1,11 +1,17 @@
+import math
+from geometry import CLASSIC, geometry, geometry_of
+
+
 def is_valid(grid, row, col, num):
-    for i in range(9):
+    size = len(grid)
+    for i in range(size):
         if grid[row][i] == num or grid[i][col] == num:
             return False
 
-    start_row, start_col = 3*(row//3), 3*(col//3)
-    for r in range(start_row,start_row + 3):
-        for c in range(start_col,start_col + 3):
+    box = int(round(math.sqrt(size)))
+    start_row, start_col = box*(row//box), box*(col//box)
+    for r in range(start_row,start_row + box):
+        for c in range(start_col,start_col + box):
             if grid[r][c] == num:
                 return False
     return True
@@ -13,8 +19,8 @@ def is_valid(grid, row, col, num):
 
 def is_filled(grid):
     filled = True
-    for row in range(9):
-        for col in range(9):
+    for row in range(len(grid)):
+        for col in range(len(grid)):
             if grid[row][col] == 0:
                 filled = False
     return filled
@@ -23,6 +29,46 @@ def copy_grid(grid):
     return [row.copy() for row in grid]
 
 def get_filled(grid):
-    return {(r, c) for r in range(9) for c in range(9) if grid[r][c] != 0}
+    return {(r, c) for r in range(len(grid)) for c in range(len(grid)) if grid[r][c] != 0}
+
+def has_conflicts(grid):
+    '''True when a digit is given twice in a row, column or box.'''
+    cells = [num for row in grid for num in row]
+    for unit in geometry_of(grid).units:
+        nums = [cells[i] for i in unit if cells[i]]
+        if len(nums) != len(set(nums)):
+            return True
+    return False
+
+
+
+
+# tables of the 9x9 board, see geometry.Geometry for other sizes
+ALL_DIGITS = CLASSIC.all_digits
+BOX_OF = CLASSIC.box_of
+POPCOUNT = CLASSIC.popcount
+DIGITS = CLASSIC.digits
+
+UNITS = CLASSIC.units
+CELL_UNITS = CLASSIC.cell_units
+PEERS = CLASSIC.peers
+PEER_MASKS = CLASSIC.peer_masks
+
 
+def grid_from_line(line):
+    '''Parses the common 81 character format, empty cells are '0' or '.'.
+    Lines of 256 or 625 characters are 16x16 and 25x25 boards with the
+    digits above 9 written as letters, A for 10 up to P for 25.'''
+    line = line.strip()
+    size = int(round(math.sqrt(len(line))))
+    if size * size != len(line) or size not in (9, 16, 25):
+        raise ValueError('expected 81, 256 or 625 characters, got %d' % len(line))
+    board = geometry(size)
+    values = [board.value(ch) for ch in line]
+    if None in values:
+        raise ValueError('unexpected character %r' % line[values.index(None)])
+    return [values[row * size:row * size + size] for row in range(size)]
 
+def grid_to_line(grid, empty='.'):
+    board = geometry(len(grid))
+    return ''.join(board.symbol(num) if num else empty for row in grid for num in row)